@@ -0,0 +1,195 @@
+import itertools
+import json
+import os
+import sys
+
+import numpy as np
+
+import json_codec
+from merge_annotation_files import group_annotation_files
+
+# 答案编码：A-D为0-3，其他（缺失或非法）为4
+ANSWER_CODES = {'A': 0, 'B': 1, 'C': 2, 'D': 3}
+ANSWER_LETTERS = ['A', 'B', 'C', 'D', '?']
+NUM_ANSWER_CODES = len(ANSWER_LETTERS)
+
+
+def read_group_questions(file_path, start_line, end_line):
+    """
+    读取文件指定行号范围内的所有问题
+
+    Returns:
+        dict: {(video_key, data_id): (行号, question_type, answer)}
+    """
+    questions = {}
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line_num, line in enumerate(itertools.islice(f, start_line - 1, end_line), start_line):
+            if not line.strip():
+                continue
+            try:
+                data = json_codec.loads(line.strip())
+            except json.JSONDecodeError as e:
+                print(f"  警告: {os.path.basename(file_path)} 第{line_num}行JSON解析错误: {e}")
+                continue
+            for video_key, items in data.items():
+                for question in items:
+                    questions[(video_key, question.get('data_id'))] = (
+                        line_num, question.get('question_type', 'Unknown'), question.get('answer')
+                    )
+    return questions
+
+
+def cohen_kappa_by_group(answers_1, answers_2, group_ids, num_groups):
+    """
+    按分组向量化计算观察一致率和Cohen's kappa
+
+    Args:
+        answers_1, answers_2 (np.ndarray): 两次标注的答案编码
+        group_ids (np.ndarray): 每个问题所属分组的编号
+        num_groups (int): 分组数量
+
+    Returns:
+        tuple: (每组问题数, 每组一致率, 每组kappa)，空分组的一致率和kappa为nan
+    """
+    counts = np.bincount(group_ids, minlength=num_groups).astype(np.float64)
+    agree = np.bincount(group_ids, weights=(answers_1 == answers_2), minlength=num_groups)
+
+    # 每组内两次标注各自的答案分布
+    size = num_groups * NUM_ANSWER_CODES
+    dist_1 = np.bincount(group_ids * NUM_ANSWER_CODES + answers_1, minlength=size).reshape(num_groups, NUM_ANSWER_CODES)
+    dist_2 = np.bincount(group_ids * NUM_ANSWER_CODES + answers_2, minlength=size).reshape(num_groups, NUM_ANSWER_CODES)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        observed = agree / counts
+        expected = (dist_1 * dist_2).sum(axis=1) / (counts * counts)
+        kappa = (observed - expected) / (1 - expected)
+    # 期望一致率为1时（两次都只用了同一个答案）kappa没有定义，完全一致时记为1
+    kappa = np.where((expected == 1) & (observed == 1), 1.0, kappa)
+    return counts.astype(np.int64), observed, kappa
+
+
+def to_number(value):
+    """把numpy的nan转换为None，方便写入JSON"""
+    value = float(value)
+    return None if np.isnan(value) else round(value, 4)
+
+
+def compute_agreement(annotation_dir, report_file=None):
+    """
+    对比annotation目录下同一行号范围的_1和_2文件，计算标注一致性
+    两次标注按 (video_key, data_id) 对齐，答案编码成NumPy整数数组后统一计算
+
+    Args:
+        annotation_dir (str): annotation目录路径
+        report_file (str): 可选，把完整报告写成JSON文件
+
+    Returns:
+        dict: 总体、按question_type、按行号范围的一致率和kappa，以及不一致的问题列表
+    """
+    keys = []
+    line_numbers = []
+    question_types = []
+    answers_1 = []
+    answers_2 = []
+    range_ids = []
+    ranges = []
+    unmatched = 0
+
+    for (start_line, end_line), files in sorted(group_annotation_files(annotation_dir).items()):
+        file_1 = next((f for f in files if f.endswith('_1.jsonl')), None)
+        file_2 = next((f for f in files if f.endswith('_2.jsonl')), None)
+        if file_1 is None or file_2 is None:
+            continue
+
+        first = read_group_questions(os.path.join(annotation_dir, file_1), start_line, end_line)
+        second = read_group_questions(os.path.join(annotation_dir, file_2), start_line, end_line)
+        unmatched += len(first.keys() ^ second.keys())
+
+        range_id = len(ranges)
+        ranges.append((start_line, end_line))
+        for key, (line_num, question_type, answer) in first.items():
+            if key not in second:
+                continue
+            keys.append(key)
+            line_numbers.append(line_num)
+            question_types.append(question_type)
+            answers_1.append(ANSWER_CODES.get(answer, 4))
+            answers_2.append(ANSWER_CODES.get(second[key][2], 4))
+            range_ids.append(range_id)
+
+    print(f"找到 {len(ranges)} 个同时有_1和_2文件的行号范围，对齐了 {len(keys)} 个问题，{unmatched} 个问题只出现在一次标注中")
+
+    answers_1 = np.asarray(answers_1, dtype=np.int64)
+    answers_2 = np.asarray(answers_2, dtype=np.int64)
+    range_ids = np.asarray(range_ids, dtype=np.int64)
+    type_names, type_ids = np.unique(np.asarray(question_types, dtype=object), return_inverse=True)
+    type_ids = type_ids.astype(np.int64)
+
+    total_count, total_observed, total_kappa = cohen_kappa_by_group(
+        answers_1, answers_2, np.zeros(len(answers_1), dtype=np.int64), 1)
+    type_count, type_observed, type_kappa = cohen_kappa_by_group(answers_1, answers_2, type_ids, len(type_names))
+    range_count, range_observed, range_kappa = cohen_kappa_by_group(answers_1, answers_2, range_ids, len(ranges))
+
+    disagreements = [
+        {
+            'line_number': line_numbers[i],
+            'video_key': keys[i][0],
+            'data_id': keys[i][1],
+            'question_type': question_types[i],
+            'range': f"{ranges[range_ids[i]][0]}-{ranges[range_ids[i]][1]}",
+            'answer_1': ANSWER_LETTERS[answers_1[i]],
+            'answer_2': ANSWER_LETTERS[answers_2[i]],
+        }
+        for i in np.flatnonzero(answers_1 != answers_2)
+    ]
+
+    report = {
+        'overall': {
+            'questions': int(total_count[0]),
+            'unmatched': unmatched,
+            'percent_agreement': to_number(total_observed[0]),
+            'kappa': to_number(total_kappa[0]),
+        },
+        'by_question_type': {
+            str(name): {
+                'questions': int(type_count[i]),
+                'percent_agreement': to_number(type_observed[i]),
+                'kappa': to_number(type_kappa[i]),
+            }
+            for i, name in enumerate(type_names)
+        },
+        'by_range': {
+            f"{start}-{end}": {
+                'questions': int(range_count[i]),
+                'percent_agreement': to_number(range_observed[i]),
+                'kappa': to_number(range_kappa[i]),
+            }
+            for i, (start, end) in enumerate(ranges)
+        },
+        'disagreements': disagreements,
+    }
+
+    overall = report['overall']
+    print("\n=== 标注一致性 ===")
+    print(f"一致率: {overall['percent_agreement']}  Cohen's kappa: {overall['kappa']}")
+    print("\n按问题类型:")
+    for name, stats in report['by_question_type'].items():
+        print(f"  {name}: {stats['questions']} 题, 一致率 {stats['percent_agreement']}, kappa {stats['kappa']}")
+    print("\n按行号范围:")
+    for name, stats in report['by_range'].items():
+        print(f"  {name}: {stats['questions']} 题, 一致率 {stats['percent_agreement']}, kappa {stats['kappa']}")
+    print(f"\n不一致的问题: {len(disagreements)} 个")
+
+    if report_file:
+        with open(report_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"报告已写入: {report_file}")
+
+    return report
+
+
+if __name__ == "__main__":
+    # python annotation_agreement.py <annotation目录> [报告.json]
+    if len(sys.argv) < 2:
+        sys.exit("用法: python annotation_agreement.py <annotation目录> [报告.json]")
+    compute_agreement(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
@@ -0,0 +1,81 @@
+import json
+import os
+import time
+
+import json_codec
+
+# Write-ahead journal of answer edits, kept next to the data file
+# (questions_converted.jsonl.journal). Every edit is one appended line so a
+# save costs O(1) bytes on disk; the question store overlays the journal on
+# the base file and folds it back in during compaction.
+JOURNAL_SUFFIX = '.journal'
+
+
+class AnswerJournal:
+    """Append-only log of (line_number, video_key, data_id, answer) edits"""
+
+    def __init__(self, data_filepath):
+        self.path = data_filepath + JOURNAL_SUFFIX
+
+    def append(self, line_number, video_key, data_id, answer):
+        """Durably append one edit"""
+        self.append_many([(line_number, video_key, data_id, answer)])
+
+    def append_many(self, edits):
+        """Durably append a batch of (line_number, video_key, data_id, answer) edits with one fsync.
+        Returns the number of bytes appended."""
+        now = time.time()
+        records = ''.join(
+            json_codec.dumps({
+                'line_number': line_number,
+                'video_key': video_key,
+                'data_id': data_id,
+                'answer': answer,
+                'time': now,
+            }) + '\n'
+            for line_number, video_key, data_id, answer in edits
+        )
+        data = records.encode('utf-8')
+        with open(self.path, 'ab') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        return len(data)
+
+    def read_entries(self, offset=0):
+        """Return (edits, end_offset) for the complete records after byte offset"""
+        entries = []
+        try:
+            with open(self.path, 'rb') as file:
+                file.seek(offset)
+                for line in file:
+                    if not line.endswith(b'\n'):
+                        # A crash in the middle of append_many() leaves a torn last line
+                        break
+                    offset += len(line)
+                    try:
+                        entries.append(json_codec.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+        except FileNotFoundError:
+            pass
+        return entries, offset
+
+    def stat_signature(self):
+        """(size, mtime) of the journal, or None if it does not exist"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def size(self):
+        signature = self.stat_signature()
+        return signature[0] if signature else 0
+
+    def clear(self):
+        """Forget every edit once they have been folded into the data file"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -1,68 +1,142 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, make_response, redirect, request, jsonify
 import json
-import matplotlib.pyplot as plt
+import os
+import signal
+import sys
+import threading
 from io import BytesIO
 import base64
+import functools
+import gzip
+import hashlib
+import html
+import itertools
+from urllib.parse import quote, urlencode
 
-from frontend_statistic import statistic_html
+import request_metrics
+from answer_journal import JOURNAL_SUFFIX
+from frontend_statistic import statistic_client_html, statistic_html
+from question_revisions import RevisionConflict
+from request_metrics import count, phase
+from storage import get_question_store, set_storage_engine
 
 app = Flask(__name__)
 
+DATA_FILE = 'questions_converted.jsonl'
+
+# SCALELONG_ANNOTATION_DIR=<dir> serves the range files of an annotation
+# directory (1_45_1.jsonl, ...) as one dataset instead of the merged file;
+# edits are written to the range files themselves
+if os.environ.get('SCALELONG_ANNOTATION_DIR'):
+    DATA_FILE = os.environ['SCALELONG_ANNOTATION_DIR']
+
+# Storage engine behind DATA_FILE: 'jsonl' reads and rewrites the file itself,
+# 'sqlite' imports it once into DATA_FILE.sqlite3 and works on the database
+STORAGE_ENGINE = os.environ.get('SCALELONG_STORAGE', 'jsonl')
+set_storage_engine(STORAGE_ENGINE)
+
+# Journal mode: saves append one record to DATA_FILE.journal instead of
+# rewriting the whole file. A background compactor folds the journal into
+# the data file once it grows past JOURNAL_MAX_BYTES or JOURNAL_MAX_AGE seconds.
+JOURNAL_MODE = os.environ.get('SCALELONG_JOURNAL', '0') == '1'
+JOURNAL_MAX_BYTES = int(os.environ.get('SCALELONG_JOURNAL_MAX_BYTES', 1024 * 1024))
+JOURNAL_MAX_AGE = float(os.environ.get('SCALELONG_JOURNAL_MAX_AGE', 300))
+
+if JOURNAL_MODE and STORAGE_ENGINE == 'jsonl':
+    get_question_store(DATA_FILE).enable_journal(JOURNAL_MAX_BYTES, JOURNAL_MAX_AGE)
+
+# Write-behind mode: saves are acknowledged once applied in memory, and a
+# background thread writes them out (to the journal in journal mode) at most
+# every WRITE_BEHIND_INTERVAL_MS. Other workers see an edit after its flush;
+# queued edits are flushed on shutdown.
+WRITE_BEHIND = os.environ.get('SCALELONG_WRITE_BEHIND', '0') == '1'
+WRITE_BEHIND_INTERVAL_MS = float(os.environ.get('SCALELONG_WRITE_BEHIND_INTERVAL_MS', 200))
+
+if WRITE_BEHIND and STORAGE_ENGINE == 'jsonl':
+    get_question_store(DATA_FILE).enable_write_behind(WRITE_BEHIND_INTERVAL_MS / 1000)
+
+# Time every request until its last byte is sent, streamed pages included
+@app.before_request
+def start_request_timing():
+    request_metrics.begin_request()
+
+@app.after_request
+def record_request_timing(response):
+    timing = request_metrics.current_timing()
+    if timing is not None:
+        method = request.method
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        status = response.status_code
+        response.call_on_close(lambda: request_metrics.finish_request(timing, method, route, status))
+    return response
+
 # Helper function to read converted JSONL file
 def read_jsonl_file(filepath, start_line=None, end_line=None):
     """Read converted JSONL file and return questions with line numbers"""
-    questions_with_lines = []
     try:
-        with open(filepath, 'r', encoding='utf-8') as file:
-            for line_num, line in enumerate(file, 1):
-                if line.strip():
-                    data = json.loads(line.strip())
-                    for video_key, questions in data.items():
-                        for question in questions:
-                            question_with_meta = {
-                                'line_number': line_num,
-                                'video_key': video_key,
-                                **question
-                            }
-                            questions_with_lines.append(question_with_meta)
-        
-        # Filter by line range if specified
-        if start_line is not None and end_line is not None:
-            questions_with_lines = [q for q in questions_with_lines 
-                                  if start_line <= q['line_number'] <= end_line]
-        
-        return questions_with_lines
+        return get_question_store(filepath).questions(start_line, end_line)
     except (FileNotFoundError, json.JSONDecodeError):
         return []
 
 # Helper function to update correct answer
-def update_correct_answer(filepath, line_number, video_key, data_id, new_answer_choice):
-    """Update correct answer choice (A/B/C/D) in JSONL file"""
-    lines = []
+def update_correct_answer(filepath, line_number, video_key, data_id, new_answer_choice, revision=None):
+    """Update correct answer choice (A/B/C/D) in JSONL file, raises RevisionConflict
+    if revision is given and the question moved past it"""
     try:
-        with open(filepath, 'r', encoding='utf-8') as file:
-            lines = file.readlines()
-        
-        if line_number <= len(lines):
-            line_data = json.loads(lines[line_number - 1].strip())
-            
-            if video_key in line_data:
-                for question in line_data[video_key]:
-                    if question['data_id'] == data_id:
-                        if new_answer_choice in ['A', 'B', 'C', 'D']:
-                            question['answer'] = new_answer_choice
-                            break
-            
-            lines[line_number - 1] = json.dumps(line_data, ensure_ascii=False) + '\n'
-            
-            with open(filepath, 'w', encoding='utf-8') as file:
-                file.writelines(lines)
-            
-            return True
+        return get_question_store(filepath).update_answer(
+            line_number, video_key, data_id, new_answer_choice, revision
+        )
+    except RevisionConflict:
+        raise
     except Exception as e:
         print(f"Error updating JSONL file: {e}")
         return False
 
+# Helper function to update many correct answers at once
+def update_correct_answers(filepath, edits):
+    """Validate and apply a list of answer edits with a single write, returns error messages.
+    Edits may carry the revision they were made against; raises RevisionConflict if any moved on"""
+    try:
+        revisions = [edit.get('revision') for edit in edits]
+        return get_question_store(filepath).update_answers([
+            (edit['line_number'], edit['video_key'], edit['data_id'], edit['correct_choice'])
+            for edit in edits
+        ], revisions if any(revision is not None for revision in revisions) else None)
+    except KeyError as e:
+        return [f"Missing field {e}"]
+    except RevisionConflict:
+        raise
+    except Exception as e:
+        print(f"Error updating JSONL file: {e}")
+        return ['Failed to update file']
+
+# Decorator for GET routes whose output only depends on the data and the request
+def etag_on_data(view):
+    """Tag responses with an ETag of the data and query string, answering 304 when unchanged"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            data_tag = get_question_store(DATA_FILE).data_tag()
+        except FileNotFoundError:
+            return view(*args, **kwargs)
+        
+        accepts_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+        etag = hashlib.sha1(f"{data_tag}|{request.full_path}|{accepts_gzip}".encode('utf-8')).hexdigest()[:20]
+        if etag in request.if_none_match:
+            count('scalelong_cache_hits_total', cache='etag')
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+        
+        count('scalelong_cache_misses_total', cache='etag')
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            response.set_etag(etag)
+            # Let browsers keep the page but revalidate it on every visit
+            response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
+
 # Main page
 @app.route('/')
 def home():
@@ -165,6 +239,20 @@ def home():
                         <label for="end_line">End Line:</label>
                         <input type="number" id="end_line" name="end_line" min="1" value="10" required>
                     </div>
+                    <div class="form-group">
+                        <label for="question_type">Question Type (optional):</label>
+                        <input type="text" id="question_type" name="question_type" placeholder="Counting Problem">
+                    </div>
+                    <div class="form-group">
+                        <label for="answer">Answer (optional):</label>
+                        <select id="answer" name="answer" style="padding: 10px;">
+                            <option value="">Any</option>
+                            <option value="A">A</option>
+                            <option value="B">B</option>
+                            <option value="C">C</option>
+                            <option value="D">D</option>
+                        </select>
+                    </div>
                     <div class="form-group">
                         <button type="submit" class="load-btn">Load Questions</button>
                         <a href="/check_statistic" class="stats-btn">View Statistics</a>
@@ -173,6 +261,40 @@ def home():
             </form>
         </div>
         
+        <div class="range-selector">
+            <h3>Jump to Question</h3>
+            <form action="/annotate" method="GET">
+                <div class="form-row">
+                    <div class="form-group">
+                        <label for="video_key">Video Key:</label>
+                        <input type="text" id="video_key" name="video_key" placeholder="uIj03RsGrJA" required>
+                    </div>
+                    <div class="form-group">
+                        <label for="data_id">Question ID (optional):</label>
+                        <input type="number" id="data_id" name="data_id" min="0">
+                    </div>
+                    <div class="form-group">
+                        <button type="submit" class="load-btn">Go to Video</button>
+                    </div>
+                </div>
+            </form>
+        </div>
+        
+        <div class="range-selector">
+            <h3>Search Questions</h3>
+            <form action="/search" method="GET">
+                <div class="form-row">
+                    <div class="form-group">
+                        <label for="q">Words in the question or options:</label>
+                        <input type="text" id="q" name="q" placeholder="gold medal" required>
+                    </div>
+                    <div class="form-group">
+                        <button type="submit" class="load-btn">Search</button>
+                    </div>
+                </div>
+            </form>
+        </div>
+        
         <div style="text-align: center; color: #6c757d;">
             <p>Please select a line range and click "Load Questions" to start annotation.</p>
         </div>
@@ -181,88 +303,104 @@ def home():
 </html>
 '''
 
-# Annotation page
-@app.route('/annotate')
-def annotate():
-    start_line = int(request.args.get('start_line', 1))
-    end_line = int(request.args.get('end_line', 10))
+# Helper function to find the lines of a video
+def find_video_lines(filepath, video_key):
+    """Return the line numbers holding video_key, looked up in the persistent key index"""
+    try:
+        return get_question_store(filepath).video_lines(video_key)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+
+# Number of lines decoded and sent per chunk of a streamed annotation page
+ANNOTATE_CHUNK_LINES = 20
+# Questions per page of a filtered annotation view
+ANNOTATE_FILTER_LIMIT = 50
+
+# Helper function to read a line range in chunks
+def iter_question_chunks(filepath, start_line, end_line, chunk_lines=ANNOTATE_CHUNK_LINES):
+    """Yield non-empty lists of questions for consecutive chunks of the line range"""
+    try:
+        end_line = min(end_line, get_question_store(filepath).line_count())
+    except FileNotFoundError:
+        return
     
-    questions = read_jsonl_file('questions_converted.jsonl', start_line, end_line)
+    for line in range(max(start_line, 1), end_line + 1, chunk_lines):
+        questions = read_jsonl_file(filepath, line, min(line + chunk_lines - 1, end_line))
+        if questions:
+            yield questions
+
+# Helper function to render one question block of the annotation page
+def render_question_html(index, question):
+    """Render the HTML block for one question, index is 1-based"""
+    options = question.get('options', {})
+    current_answer = question.get('answer', 'A')
     
-    if not questions:
-        return '''
-        <div style="text-align: center; padding: 50px; font-family: Arial;">
-            <h2>❌ No questions found</h2>
-            <p>Please check if questions_converted.jsonl exists in the current directory.</p>
-            <a href="/" style="background-color: #007bff; color: white; padding: 10px 20px; text-decoration: none; border-radius: 4px;">← Back</a>
+    # Generate options HTML
+    options_html = ""
+    for choice in ['A', 'B', 'C', 'D']:
+        option_text = options.get(choice, f'Option {choice}')
+        is_current = (choice == current_answer)
+        options_html += f'''
+        <div class="answer-option" data-choice="{choice}" style="padding: 10px; margin: 8px 0; background-color: {'#d4edda' if is_current else '#f8f9fa'}; 
+                    border-radius: 4px; border-left: 4px solid {'#28a745' if is_current else '#007bff'};">
+            <strong>{choice}:</strong> {option_text}
+            <span class="current-mark">{' ✅ (Current)' if is_current else ''}</span>
         </div>
         '''
     
-    # Generate HTML for questions
-    questions_html = ""
-    for i, question in enumerate(questions):
-        options = question.get('options', {})
-        current_answer = question.get('answer', 'A')
+    return f'''
+    <div id="question-{question['video_key']}-{question['data_id']}" style="border: 1px solid #dee2e6; border-radius: 8px; padding: 20px; margin-bottom: 20px; background-color: white;">
+        <div style="background-color: #e9ecef; padding: 10px; border-radius: 4px; margin-bottom: 15px; font-weight: bold;">
+            📋 Question {index} (Line {question['line_number']}, Video: {question['video_key']}, ID: {question['data_id']})
+        </div>
         
-        # Generate options HTML
-        options_html = ""
-        for choice in ['A', 'B', 'C', 'D']:
-            option_text = options.get(choice, f'Option {choice}')
-            is_current = (choice == current_answer)
-            options_html += f'''
-            <div style="padding: 10px; margin: 8px 0; background-color: {'#d4edda' if is_current else '#f8f9fa'}; 
-                        border-radius: 4px; border-left: 4px solid {'#28a745' if is_current else '#007bff'};">
-                <strong>{choice}:</strong> {option_text}
-                {' ✅ (Current)' if is_current else ''}
-            </div>
-            '''
+                     <div style="margin-bottom: 15px; font-size: 14px; color: #6c757d;">
+             <strong>Type:</strong> {question.get('question_type', 'N/A')}
+         </div>
         
-        questions_html += f'''
-        <div style="border: 1px solid #dee2e6; border-radius: 8px; padding: 20px; margin-bottom: 20px; background-color: white;">
-            <div style="background-color: #e9ecef; padding: 10px; border-radius: 4px; margin-bottom: 15px; font-weight: bold;">
-                📋 Question {i+1} (Line {question['line_number']}, Video: {question['video_key']}, ID: {question['data_id']})
-            </div>
-            
-                         <div style="margin-bottom: 15px; font-size: 14px; color: #6c757d;">
-                 <strong>Type:</strong> {question.get('question_type', 'N/A')}
-             </div>
-            
-                         <div style="margin-bottom: 20px;">
-                 <strong>❓ Question:</strong> {question.get('question', '')}
-             </div>
-             
-             <div style="margin-bottom: 20px;">
-                 <strong>🎥 Video:</strong> 
-                 <a href="https://www.youtube.com/watch?v={question['video_key']}" target="_blank" 
-                    style="color: #dc3545; text-decoration: none; font-weight: bold;">
-                    📺 Watch Video ({question['video_key']})
-                 </a>
-             </div>
-            
-            <div style="margin-bottom: 20px;">
-                <strong>📝 Options:</strong>
-                {options_html}
-            </div>
-            
-            <div style="background-color: #fff3cd; padding: 15px; border-radius: 4px; border: 1px solid #ffeaa7;">
-                <strong>Select Correct Answer:</strong>
-                <form onsubmit="updateAnswer(event, {question['line_number']}, '{question['video_key']}', {question['data_id']})" style="display: flex; align-items: center; gap: 10px; margin-top: 10px;">
-                    <select name="correct_choice" required style="padding: 8px; border: 1px solid #ced4da; border-radius: 4px;">
-                        <option value="A" {'selected' if current_answer == 'A' else ''}>A</option>
-                        <option value="B" {'selected' if current_answer == 'B' else ''}>B</option>
-                        <option value="C" {'selected' if current_answer == 'C' else ''}>C</option>
-                        <option value="D" {'selected' if current_answer == 'D' else ''}>D</option>
-                    </select>
-                    <button type="submit" style="background-color: #28a745; color: white; border: none; padding: 8px 16px; border-radius: 4px; cursor: pointer;">
-                        💾 Save
-                    </button>
-                </form>
-            </div>
+                     <div style="margin-bottom: 20px;">
+             <strong>❓ Question:</strong> {question.get('question', '')}
+         </div>
+         
+         <div style="margin-bottom: 20px;">
+             <strong>🎥 Video:</strong> 
+             <a href="https://www.youtube.com/watch?v={question['video_key']}" target="_blank" 
+                style="color: #dc3545; text-decoration: none; font-weight: bold;">
+                📺 Watch Video ({question['video_key']})
+             </a>
+         </div>
+        
+        <div style="margin-bottom: 20px;">
+            <strong>📝 Options:</strong>
+            {options_html}
         </div>
-        '''
-    
-    return f'''
-<!DOCTYPE html>
+        
+        <div style="background-color: #fff3cd; padding: 15px; border-radius: 4px; border: 1px solid #ffeaa7;">
+            <strong>Select Correct Answer:</strong>
+            <form class="answer-form" data-line-number="{question['line_number']}" data-video-key="{question['video_key']}" data-data-id="{question['data_id']}" data-current="{current_answer}" data-revision="{question.get('revision', 0)}"
+                  onsubmit="updateAnswer(event, {question['line_number']}, '{question['video_key']}', {question['data_id']})" style="display: flex; align-items: center; gap: 10px; margin-top: 10px;">
+                <select name="correct_choice" required style="padding: 8px; border: 1px solid #ced4da; border-radius: 4px;">
+                    <option value="A" {'selected' if current_answer == 'A' else ''}>A</option>
+                    <option value="B" {'selected' if current_answer == 'B' else ''}>B</option>
+                    <option value="C" {'selected' if current_answer == 'C' else ''}>C</option>
+                    <option value="D" {'selected' if current_answer == 'D' else ''}>D</option>
+                </select>
+                <button type="submit" style="background-color: #28a745; color: white; border: none; padding: 8px 16px; border-radius: 4px; cursor: pointer;">
+                    💾 Save
+                </button>
+            </form>
+        </div>
+    </div>
+    '''
+
+# Helper function to render the start of the annotation page
+def render_annotate_header(start_line, end_line, filters=None):
+    """Everything up to the first question block, filters is {name: value} of a filtered view"""
+    description = 'questions'
+    if filters:
+        description = 'questions with ' + ', '.join(f'{name} {html.escape(value)}' for name, value in filters.items())
+    line_range = f'lines {start_line} to {end_line}' if end_line is not None else f'line {start_line} on'
+    return f'''<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
@@ -312,6 +450,19 @@ def annotate():
             text-decoration: none;
             color: white;
         }}
+        .save-all-btn {{
+            background-color: #007bff;
+            color: white;
+            padding: 10px 20px;
+            border: none;
+            border-radius: 4px;
+            margin-left: 10px;
+            cursor: pointer;
+            font-size: 16px;
+        }}
+        .save-all-btn:hover {{
+            background-color: #0056b3;
+        }}
         .success-message {{
             background-color: #d4edda;
             color: #155724;
@@ -327,17 +478,115 @@ def annotate():
     <div class="container">
         <div class="header">
             <h1>📝 Question Annotation</h1>
-            <p>Editing questions from lines {start_line} to {end_line} ({len(questions)} questions)</p>
+            <p>Editing {description} from {line_range} (<span id="question-count">…</span> questions)</p>
             <a href="/" class="back-btn">← Back</a>
             <a href="/check_statistic" class="stats-btn">📊 Statistics</a>
+            <button type="button" class="save-all-btn" onclick="saveAll()">💾 Save All</button>
         </div>
         
         <div id="success-message" class="success-message"></div>
         
-        {questions_html}
+'''
+
+# Helper function to render the end of the annotation page
+def render_annotate_footer(question_count, next_url=None):
+    """Everything after the last question block, with a link to next_url if there is a next page"""
+    next_link = ''
+    if next_url:
+        next_link = f'''
+        <div style="text-align: center;">
+            <a href="{html.escape(next_url)}" class="back-btn">Next page →</a>
+        </div>
+        '''
+    return f'''{next_link}
     </div>
     
     <script>
+        document.getElementById('question-count').textContent = {question_count};
+
+        function showMessage(text, isError) {{
+            const successMessage = document.getElementById('success-message');
+            successMessage.textContent = text;
+            successMessage.style.display = 'block';
+            successMessage.style.backgroundColor = isError ? '#f8d7da' : '#d4edda';
+            successMessage.style.color = isError ? '#721c24' : '#155724';
+        }}
+
+        function findForm(question) {{
+            return Array.from(document.querySelectorAll('.answer-form')).find(form =>
+                parseInt(form.dataset.lineNumber) === question.line_number &&
+                form.dataset.videoKey === question.video_key &&
+                parseInt(form.dataset.dataId) === question.data_id);
+        }}
+
+        function showCurrentAnswer(question) {{
+            // Reflect the stored answer and revision in place; the selection is left as the user made it
+            const form = findForm(question);
+            if (!form) {{
+                return;
+            }}
+            form.dataset.current = question.answer;
+            form.dataset.revision = question.revision;
+            form.parentElement.parentElement.querySelectorAll('.answer-option').forEach(option => {{
+                const isCurrent = option.dataset.choice === question.answer;
+                option.style.backgroundColor = isCurrent ? '#d4edda' : '#f8f9fa';
+                option.style.borderLeftColor = isCurrent ? '#28a745' : '#007bff';
+                option.querySelector('.current-mark').textContent = isCurrent ? ' ✅ (Current)' : '';
+            }});
+        }}
+
+        function conflictMessage(conflicts) {{
+            conflicts.forEach(showCurrentAnswer);
+            const changed = conflicts.map(question =>
+                'line ' + question.line_number + ' ' + question.video_key + '/' + question.data_id + ' is now ' + question.answer);
+            return '⚠️ Changed by someone else meanwhile (' + changed.join('; ') + '). Save again to overwrite.';
+        }}
+
+        function saveAll() {{
+            // Send every changed answer on the page in one request
+            const edits = [];
+            document.querySelectorAll('.answer-form').forEach(form => {{
+                const correctChoice = form.correct_choice.value;
+                if (correctChoice !== form.dataset.current) {{
+                    edits.push({{
+                        line_number: parseInt(form.dataset.lineNumber),
+                        video_key: form.dataset.videoKey,
+                        data_id: parseInt(form.dataset.dataId),
+                        correct_choice: correctChoice,
+                        revision: parseInt(form.dataset.revision)
+                    }});
+                }}
+            }});
+
+            if (edits.length === 0) {{
+                showMessage('ℹ️ No changed answers to save', false);
+                return;
+            }}
+
+            fetch('/update_answers', {{
+                method: 'POST',
+                headers: {{
+                    'Content-Type': 'application/json',
+                }},
+                body: JSON.stringify({{ edits: edits }})
+            }})
+            .then(response => response.json())
+            .then(data => {{
+                if (data.success) {{
+                    data.questions.forEach(showCurrentAnswer);
+                    showMessage('✅ ' + data.updated + ' answers updated successfully!', false);
+                }} else if (data.conflicts) {{
+                    showMessage(conflictMessage(data.conflicts), true);
+                }} else {{
+                    showMessage('❌ Error: ' + data.errors.join('; '), true);
+                }}
+            }})
+            .catch(error => {{
+                console.error('Error:', error);
+                showMessage('❌ Network error', true);
+            }});
+        }}
+
         function updateAnswer(event, lineNumber, videoKey, dataId) {{
             event.preventDefault();
             
@@ -353,40 +602,27 @@ def annotate():
                     line_number: lineNumber,
                     video_key: videoKey,
                     data_id: dataId,
-                    correct_choice: correctChoice
+                    correct_choice: correctChoice,
+                    revision: parseInt(form.dataset.revision)
                 }})
             }})
             .then(response => response.json())
             .then(data => {{
-                const successMessage = document.getElementById('success-message');
                 if (data.success) {{
-                    successMessage.textContent = '✅ Answer updated successfully!';
-                    successMessage.style.display = 'block';
-                    successMessage.style.backgroundColor = '#d4edda';
-                    successMessage.style.color = '#155724';
-                    
-                    // Reload page to show updated answer
+                    showCurrentAnswer(data);
+                    showMessage('✅ Answer updated successfully!', false);
                     setTimeout(() => {{
-                        location.reload();
-                    }}, 1000);
+                        document.getElementById('success-message').style.display = 'none';
+                    }}, 3000);
+                }} else if (data.conflicts) {{
+                    showMessage(conflictMessage(data.conflicts), true);
                 }} else {{
-                    successMessage.textContent = '❌ Error: ' + data.error;
-                    successMessage.style.display = 'block';
-                    successMessage.style.backgroundColor = '#f8d7da';
-                    successMessage.style.color = '#721c24';
+                    showMessage('❌ Error: ' + data.error, true);
                 }}
-                
-                setTimeout(() => {{
-                    successMessage.style.display = 'none';
-                }}, 3000);
             }})
             .catch(error => {{
                 console.error('Error:', error);
-                const successMessage = document.getElementById('success-message');
-                successMessage.textContent = '❌ Network error';
-                successMessage.style.display = 'block';
-                successMessage.style.backgroundColor = '#f8d7da';
-                successMessage.style.color = '#721c24';
+                showMessage('❌ Network error', true);
             }});
         }}
     </script>
@@ -394,131 +630,539 @@ def annotate():
 </html>
 '''
 
+# Annotation page
+@app.route('/annotate')
+@etag_on_data
+def annotate():
+    video_key = request.args.get('video_key', '').strip()
+    if video_key:
+        # Jump straight to the line holding the video, scrolled to the question if one is given
+        lines = find_video_lines(DATA_FILE, video_key)
+        if not lines:
+            return f'''
+        <div style="text-align: center; padding: 50px; font-family: Arial;">
+            <h2>❌ Video not found</h2>
+            <p>No questions found for video {html.escape(video_key)}.</p>
+            <a href="/" style="background-color: #007bff; color: white; padding: 10px 20px; text-decoration: none; border-radius: 4px;">← Back</a>
+        </div>
+        ''', 404
+        anchor = f"#question-{quote(video_key)}-{request.args['data_id']}" if request.args.get('data_id') else ''
+        return redirect(f"/annotate?start_line={lines[0]}&end_line={lines[0]}{anchor}")
+
+    filters = {name: request.args[name] for name in ('question_type', 'answer') if request.args.get(name)}
+    try:
+        # Filtered views run to the end of the data unless end_line is given
+        start_line, end_line, cursor_line, cursor_position = read_annotate_position(None if filters else 10)
+    except ValueError:
+        return '''
+        <div style="text-align: center; padding: 50px; font-family: Arial;">
+            <h2>❌ Invalid request</h2>
+            <p>Invalid cursor, start_line or end_line.</p>
+            <a href="/" style="background-color: #007bff; color: white; padding: 10px 20px; text-decoration: none; border-radius: 4px;">← Back</a>
+        </div>
+        ''', 400
+    if filters:
+        return annotate_filtered(filters, start_line, end_line, cursor_line, cursor_position)
+    
+    # Decode lines in chunks so the first questions are sent before the rest are read
+    chunks = iter_question_chunks(DATA_FILE, start_line, end_line)
+    first_chunk = next(chunks, None)
+    
+    if first_chunk is None:
+        return '''
+        <div style="text-align: center; padding: 50px; font-family: Arial;">
+            <h2>❌ No questions found</h2>
+            <p>Please check if questions_converted.jsonl exists in the current directory.</p>
+            <a href="/" style="background-color: #007bff; color: white; padding: 10px 20px; text-decoration: none; border-radius: 4px;">← Back</a>
+        </div>
+        '''
+    
+    def generate():
+        yield render_annotate_header(start_line, end_line)
+        question_count = 0
+        for questions in itertools.chain([first_chunk], chunks):
+            with phase('html_render'):
+                blocks = []
+                for question in questions:
+                    question_count += 1
+                    blocks.append(render_question_html(question_count, question))
+            yield ''.join(blocks)
+        yield render_annotate_footer(question_count)
+    
+    return Response(generate(), mimetype='text/html')
+
+# Helper function to read one page of a filtered view
+def filter_questions(filepath, question_type=None, answer=None, cursor_line=1, cursor_position=0,
+                     end_line=None, limit=ANNOTATE_FILTER_LIMIT):
+    """Return (questions, next_cursor) for questions matching the filters, via the posting lists"""
+    try:
+        return get_question_store(filepath).filter_questions(
+            question_type, answer, cursor_line, cursor_position, end_line, limit)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return [], None
+
+# Helper function to read the line range and cursor of an annotation page request
+def read_annotate_position(default_end_line):
+    """Return (start_line, end_line, cursor_line, cursor_position), raising ValueError on malformed values"""
+    start_line = int(request.args.get('start_line', 1))
+    end_line = request.args.get('end_line')
+    end_line = default_end_line if end_line is None else int(end_line)
+    cursor = request.args.get('cursor', '')
+    if cursor:
+        cursor_line, cursor_position = (int(part) for part in cursor.split(':'))
+    else:
+        cursor_line, cursor_position = start_line, 0
+    return start_line, end_line, cursor_line, cursor_position
+
+# Annotation page restricted to one question_type and/or answer
+def annotate_filtered(filters, start_line, end_line, cursor_line, cursor_position):
+    questions, next_cursor = filter_questions(
+        DATA_FILE, filters.get('question_type'), filters.get('answer'), cursor_line, cursor_position, end_line)
+    
+    if not questions:
+        return '''
+        <div style="text-align: center; padding: 50px; font-family: Arial;">
+            <h2>❌ No questions found</h2>
+            <p>No questions match these filters in the selected lines.</p>
+            <a href="/" style="background-color: #007bff; color: white; padding: 10px 20px; text-decoration: none; border-radius: 4px;">← Back</a>
+        </div>
+        '''
+    
+    next_url = None
+    if next_cursor:
+        params = {**filters, 'start_line': start_line, 'cursor': next_cursor}
+        if end_line is not None:
+            params['end_line'] = end_line
+        next_url = '/annotate?' + urlencode(params)
+    
+    def generate():
+        yield render_annotate_header(start_line, end_line, filters)
+        with phase('html_render'):
+            blocks = [render_question_html(i, question) for i, question in enumerate(questions, 1)]
+        yield ''.join(blocks)
+        yield render_annotate_footer(len(questions), next_url)
+    
+    return Response(generate(), mimetype='text/html')
+
+# Edits made against an older revision are refused with the questions' current state
+def revision_conflict_response(conflict):
+    count('scalelong_revision_conflicts_total')
+    return jsonify({'success': False, 'error': 'Revision conflict', 'conflicts': conflict.conflicts}), 409
+
 # Update answer endpoint
 @app.route('/update_answer', methods=['POST'])
 def update_answer():
     data = request.get_json()
     
-    success = update_correct_answer(
-        'questions_converted.jsonl',
-        data['line_number'],
-        data['video_key'],
-        data['data_id'],
-        data['correct_choice']
-    )
+    try:
+        success = update_correct_answer(
+            DATA_FILE,
+            data['line_number'],
+            data['video_key'],
+            data['data_id'],
+            data['correct_choice'],
+            data.get('revision')
+        )
+    except RevisionConflict as conflict:
+        return revision_conflict_response(conflict)
     
     if success:
-        return jsonify({'success': True})
+        count('scalelong_edits_total')
+        states = question_states(DATA_FILE, [(data['line_number'], data['video_key'], data['data_id'])])
+        return jsonify({'success': True, **(states[0] if states else {})})
     else:
         return jsonify({'success': False, 'error': 'Failed to update file'})
 
-# Statistics page
-@app.route('/check_statistic')
-def check_statistic():
-    all_questions = read_jsonl_file('questions_converted.jsonl')
+# Batch update endpoint
+@app.route('/update_answers', methods=['POST'])
+def update_answers():
+    data = request.get_json()
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'error': 'Expected a JSON object'}), 400
+    edits = data.get('edits', [])
+    if not isinstance(edits, list) or not all(isinstance(edit, dict) for edit in edits):
+        return jsonify({'success': False, 'error': 'edits must be a list of objects'}), 400
+    for edit in edits:
+        revision = edit.get('revision')
+        if revision is not None and (not isinstance(revision, int) or isinstance(revision, bool)):
+            return jsonify({'success': False, 'error': 'revision must be an integer'}), 400
     
-    if not all_questions:
-        return "<h2>No data found. Please check if questions_converted.jsonl exists.</h2>"
+    try:
+        errors = update_correct_answers(DATA_FILE, edits)
+    except RevisionConflict as conflict:
+        return revision_conflict_response(conflict)
+    
+    if not errors:
+        count('scalelong_edits_total', len(edits))
+        keys = dict.fromkeys((edit['line_number'], edit['video_key'], edit['data_id']) for edit in edits)
+        return jsonify({'success': True, 'updated': len(edits), 'questions': question_states(DATA_FILE, keys)})
+    else:
+        return jsonify({'success': False, 'error': errors[0], 'errors': errors})
+
+# Fields of a flattened question record that /api/questions can return
+QUESTION_FIELDS = ['line_number', 'video_key', 'data_id', 'question', 'options', 'answer', 'question_type', 'revision']
+API_DEFAULT_LIMIT = 100
+API_MAX_LIMIT = 1000
+# Responses smaller than this are not worth compressing
+GZIP_MIN_BYTES = 1024
+
+# Helper function to read one page of questions after a cursor
+def read_question_page(filepath, cursor_line, cursor_index, limit, end_line=None):
+    """Return (questions, next_cursor) starting at question cursor_index of line cursor_line"""
+    store = get_question_store(filepath)
+    last_line = store.line_count()
+    if end_line is not None:
+        last_line = min(last_line, end_line)
+    
+    page = []
+    current_line, position = None, 0
+    for line in range(max(cursor_line, 1), last_line + 1, ANNOTATE_CHUNK_LINES):
+        for question in read_jsonl_file(filepath, line, min(line + ANNOTATE_CHUNK_LINES - 1, last_line)):
+            # position is the index of the question within its own line
+            if question['line_number'] != current_line:
+                current_line, position = question['line_number'], 0
+            else:
+                position += 1
+            if current_line == cursor_line and position < cursor_index:
+                continue
+            if len(page) == limit:
+                return page, f"{current_line}:{position}"
+            page.append(question)
+    return page, None
+
+# Helper function to build a gzip-compressed JSON response
+def compressed_json(payload, status=200):
+    """jsonify payload, gzip-compressing it when the client accepts gzip"""
+    response = jsonify(payload)
+    response.status_code = status
+    response.vary.add('Accept-Encoding')
+    if 'gzip' in request.headers.get('Accept-Encoding', '') and response.content_length >= GZIP_MIN_BYTES:
+        response.set_data(gzip.compress(response.get_data(), compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+# Questions API
+@app.route('/api/questions')
+@etag_on_data
+def api_questions():
+    try:
+        cursor = request.args.get('cursor', '')
+        if cursor:
+            cursor_line, cursor_index = (int(part) for part in cursor.split(':'))
+        else:
+            cursor_line, cursor_index = int(request.args.get('start_line', 1)), 0
+        end_line = request.args.get('end_line', type=int)
+        limit = min(int(request.args.get('limit', API_DEFAULT_LIMIT)), API_MAX_LIMIT)
+    except ValueError:
+        return compressed_json({'success': False, 'error': 'Invalid cursor, start_line or limit'}, 400)
+    if limit < 1:
+        return compressed_json({'success': False, 'error': 'limit must be positive'}, 400)
+    
+    fields = [field for field in request.args.get('fields', '').split(',') if field]
+    unknown_fields = [field for field in fields if field not in QUESTION_FIELDS]
+    if unknown_fields:
+        return compressed_json({'success': False, 'error': f"Unknown fields: {', '.join(unknown_fields)}"}, 400)
+    
+    try:
+        version = get_question_store(DATA_FILE).current_version()
+        questions, next_cursor = read_question_page(DATA_FILE, cursor_line, cursor_index, limit, end_line)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return compressed_json({'success': False, 'error': 'No data found'}, 404)
     
-    # Prepare data for statistics
+    if fields:
+        questions = [{field: question[field] for field in fields if field in question} for question in questions]
+    
+    return compressed_json({
+        'success': True,
+        'version': version,
+        'questions': questions,
+        'next_cursor': next_cursor
+    })
+
+SEARCH_PAGE_SIZE = 20
+
+# Helper function to read back the answer and revision of edited questions
+def question_states(filepath, keys):
+    """Return {line_number, video_key, data_id, answer, revision} for every (line_number, video_key, data_id)"""
+    states = []
+    for line_number, video_key, data_id in keys:
+        for question in read_jsonl_file(filepath, line_number, line_number):
+            if question['video_key'] == video_key and question['data_id'] == data_id:
+                states.append({'line_number': line_number, 'video_key': video_key, 'data_id': data_id,
+                               'answer': question.get('answer', 'Unknown'), 'revision': question.get('revision', 0)})
+                break
+    return states
+
+# Helper function to search questions
+def search_questions(filepath, query, question_type=None, answer=None, page=1, limit=SEARCH_PAGE_SIZE):
+    """Return (total matches, questions on this page) ranked by relevance.
+
+    Each question carries its score; answers are filtered against the live
+    data because the search index does not store them.
+    """
+    try:
+        ranked = get_question_store(filepath).search(query, question_type)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return 0, []
+
+    line_questions = {}
+    def load(line_number):
+        if line_number not in line_questions:
+            line_questions[line_number] = {
+                (question['video_key'], question['data_id']): question
+                for question in read_jsonl_file(filepath, line_number, line_number)
+            }
+        return line_questions[line_number]
+
+    if answer:
+        ranked = [
+            result for result in ranked
+            if load(result[1]).get((result[2], result[3]), {}).get('answer') == answer
+        ]
+
     questions = []
-    for q in all_questions:
-        question_data = {
-            "video_type": "sport",
-            "hierarchy": "multiple_choice",  # Since granularity field is removed
-            "question_type": q.get("question_type", "Unknown"),
-            "wrong_choice_design": "multiple_choice"
-        }
-        questions.append(question_data)
+    for score, line_number, video_key, data_id in ranked[(page - 1) * limit:page * limit]:
+        question = load(line_number).get((video_key, data_id))
+        if question is not None:
+            questions.append({'score': round(score, 4), **question})
+    return len(ranked), questions
 
-    # Generate statistics
-    import matplotlib
-    matplotlib.use('Agg')
+# Helper function to render the search page
+def render_search_page(query, question_type, answer, page, total, questions):
+    """Search form, ranked results linking into /annotate, and page links"""
+    def page_link(target_page):
+        params = {'q': query, 'question_type': question_type or '', 'answer': answer or '', 'page': target_page}
+        return '/search?' + urlencode({key: value for key, value in params.items() if value})
 
-    # Video Type Statistics
-    video_type_counts = {}
-    for question in questions:
-        video_type = question.get("video_type", "Unknown")
-        video_type_counts[video_type] = video_type_counts.get(video_type, 0) + 1
-
-    plt.figure(figsize=(8, 6))
-    plt.bar(video_type_counts.keys(), video_type_counts.values(), color='skyblue')
-    plt.title("Video Types Distribution")
-    plt.xlabel("Video Type")
-    plt.ylabel("Count")
-    plt.tight_layout()
-
-    video_buf = BytesIO()
-    plt.savefig(video_buf, format='png')
-    video_buf.seek(0)
-    video_image_base64 = base64.b64encode(video_buf.read()).decode('utf-8')
-    video_buf.close()
-    plt.close()
-
-    # Hierarchy Statistics
-    hierarchy_counts = {}
-    for question in questions:
-        hierarchy = question.get("hierarchy", "Unknown")
-        hierarchy_counts[hierarchy] = hierarchy_counts.get(hierarchy, 0) + 1
-
-    plt.figure(figsize=(8, 6))
-    plt.bar(hierarchy_counts.keys(), hierarchy_counts.values(), color='lightgreen')
-    plt.title("Granularity Distribution")
-    plt.xlabel("Granularity")
-    plt.ylabel("Count")
-    plt.tight_layout()
-
-    hierarchy_buf = BytesIO()
-    plt.savefig(hierarchy_buf, format='png')
-    hierarchy_buf.seek(0)
-    hierarchy_image_base64 = base64.b64encode(hierarchy_buf.read()).decode('utf-8')
-    hierarchy_buf.close()
-    plt.close()
-
-    # Question Type Statistics
-    question_type_counts = {}
+    answer_options = ''.join(
+        f'<option value="{choice}" {"selected" if choice == answer else ""}>{choice}</option>'
+        for choice in ['A', 'B', 'C', 'D']
+    )
+    results_html = ''
     for question in questions:
-        question_type = question.get("question_type", "Unknown")
-        question_type_counts[question_type] = question_type_counts.get(question_type, 0) + 1
-
-    plt.figure(figsize=(10, 6))
-    plt.bar(question_type_counts.keys(), question_type_counts.values(), color='lightblue')
-    plt.title("Question Types Distribution")
-    plt.xlabel("Question Type")
-    plt.xticks(rotation=45, ha='right')
-    plt.ylabel("Count")
-    plt.tight_layout()
-
-    question_type_buf = BytesIO()
-    plt.savefig(question_type_buf, format='png')
-    question_type_buf.seek(0)
-    question_type_image_base64 = base64.b64encode(question_type_buf.read()).decode('utf-8')
-    question_type_buf.close()
-    plt.close()
-
-    # Simple design type
-    wrong_choice_design_counts = {"multiple_choice": len(questions)}
-
-    plt.figure(figsize=(8, 6))
-    plt.bar(wrong_choice_design_counts.keys(), wrong_choice_design_counts.values(), color='orange')
-    plt.title("Question Format")
-    plt.xlabel("Format Type")
-    plt.ylabel("Count")
-    plt.tight_layout()
-
-    wrong_choice_design_buf = BytesIO()
-    plt.savefig(wrong_choice_design_buf, format='png')
-    wrong_choice_design_buf.seek(0)
-    wrong_choice_design_image_base64 = base64.b64encode(wrong_choice_design_buf.read()).decode('utf-8')
-    wrong_choice_design_buf.close()
-    plt.close()
-
-    return statistic_html.format(
-        video_image=video_image_base64, 
-        hierarchy_image=hierarchy_image_base64, 
-        question_type_image=question_type_image_base64, 
-        wrong_choice_design_image=wrong_choice_design_image_base64
+        link = (f"/annotate?start_line={question['line_number']}&end_line={question['line_number']}"
+                f"#question-{quote(question['video_key'])}-{question['data_id']}")
+        results_html += f'''
+        <div style="border: 1px solid #dee2e6; border-radius: 8px; padding: 15px; margin-bottom: 15px;">
+            <a href="{link}" style="font-weight: bold; color: #007bff; text-decoration: none;">
+                Line {question['line_number']}, Video: {html.escape(question['video_key'])}, ID: {question['data_id']}
+            </a>
+            <div style="margin-top: 8px;">{html.escape(str(question.get('question', '')))}</div>
+            <div style="margin-top: 8px; font-size: 14px; color: #6c757d;">
+                <strong>Type:</strong> {html.escape(str(question.get('question_type', 'N/A')))}
+                &nbsp; <strong>Answer:</strong> {html.escape(str(question.get('answer', '')))}
+                &nbsp; <strong>Score:</strong> {question['score']}
+            </div>
+        </div>
+        '''
+
+    page_count = max(1, -(-total // SEARCH_PAGE_SIZE))
+    navigation = ''
+    if page > 1:
+        navigation += f'<a href="{page_link(page - 1)}">← Previous</a> '
+    navigation += f'Page {page} of {page_count}'
+    if page < page_count:
+        navigation += f' <a href="{page_link(page + 1)}">Next →</a>'
+
+    return f'''<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Search Questions</title>
+</head>
+<body style="font-family: Arial, sans-serif; background-color: #f9f9f9; margin: 0; padding: 20px;">
+    <div style="max-width: 1000px; margin: 0 auto; background-color: white; padding: 30px; border-radius: 8px; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);">
+        <h1 style="text-align: center;">🔍 Search Questions</h1>
+        <form action="/search" method="GET" style="display: flex; gap: 10px; margin-bottom: 20px;">
+            <input type="text" name="q" value="{html.escape(query)}" required style="flex: 1; padding: 10px;">
+            <input type="text" name="question_type" value="{html.escape(question_type or '')}" placeholder="Question type" style="padding: 10px;">
+            <select name="answer" style="padding: 10px;"><option value="">Any answer</option>{answer_options}</select>
+            <button type="submit" style="background-color: #007bff; color: white; border: none; padding: 10px 20px; border-radius: 4px;">Search</button>
+        </form>
+        <p>{total} matching questions. <a href="/">← Back</a></p>
+        {results_html}
+        <p style="text-align: center;">{navigation}</p>
+    </div>
+</body>
+</html>
+'''
+
+# Search page
+@app.route('/search')
+@etag_on_data
+def search_page():
+    query = request.args.get('q', '').strip()
+    question_type = request.args.get('question_type') or None
+    answer = request.args.get('answer') or None
+    page = max(request.args.get('page', 1, type=int), 1)
+    
+    total, questions = search_questions(DATA_FILE, query, question_type, answer, page) if query else (0, [])
+    return render_search_page(query, question_type, answer, page, total, questions)
+
+# Search API
+@app.route('/api/search')
+@etag_on_data
+def api_search():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return compressed_json({'success': False, 'error': 'q is required'}, 400)
+    try:
+        page = int(request.args.get('page', 1))
+        limit = min(int(request.args.get('limit', SEARCH_PAGE_SIZE)), API_MAX_LIMIT)
+    except ValueError:
+        return compressed_json({'success': False, 'error': 'Invalid page or limit'}, 400)
+    if page < 1 or limit < 1:
+        return compressed_json({'success': False, 'error': 'page and limit must be positive'}, 400)
+    
+    total, questions = search_questions(
+        DATA_FILE, query, request.args.get('question_type') or None, request.args.get('answer') or None, page, limit)
+    return compressed_json({
+        'success': True,
+        'total': total,
+        'page': page,
+        'questions': questions
+    })
+
+# Helper function to read dataset statistics
+def read_statistics(filepath):
+    """Return (data version, distributions) over every question, or (None, None) if unreadable"""
+    try:
+        return get_question_store(filepath).statistics()
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None, None
+
+# Rendered chart images, reused while the counts they show are unchanged
+chart_cache = {}
+# Rendered statistics page and the data version it was built from
+statistic_page_cache = {'version': None, 'html': None}
+# pyplot keeps global state, so only one thread may draw at a time
+chart_lock = threading.Lock()
+
+# Helper function to render a bar chart as base64 PNG
+def render_bar_chart(name, counts, title, xlabel, color, figsize=(8, 6), rotate_labels=False):
+    """Render counts as a bar chart, reusing the cached image if the counts did not change"""
+    cache_key = tuple(counts.items())
+    with chart_lock:
+        cached = chart_cache.get(name)
+        if cached is not None and cached[0] == cache_key:
+            count('scalelong_cache_hits_total', cache='chart')
+            return cached[1]
+        count('scalelong_cache_misses_total', cache='chart')
+
+        # matplotlib is slow to import, so only load it once a PNG is actually requested
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+
+        with phase('chart_render'):
+            plt.figure(figsize=figsize)
+            plt.bar(counts.keys(), counts.values(), color=color)
+            plt.title(title)
+            plt.xlabel(xlabel)
+            if rotate_labels:
+                plt.xticks(rotation=45, ha='right')
+            plt.ylabel("Count")
+            plt.tight_layout()
+
+        with phase('chart_encode'):
+            buf = BytesIO()
+            plt.savefig(buf, format='png')
+            buf.seek(0)
+            image_base64 = base64.b64encode(buf.read()).decode('utf-8')
+            buf.close()
+            plt.close()
+
+        chart_cache[name] = (cache_key, image_base64)
+        return image_base64
+
+# Statistics API
+@app.route('/api/statistics')
+@etag_on_data
+def api_statistics():
+    version, distributions = read_statistics(DATA_FILE)
+    
+    if not distributions or not distributions['question_type']:
+        return jsonify({'success': False, 'error': 'No data found'}), 404
+    
+    return jsonify({
+        'success': True,
+        'version': version,
+        'total': sum(distributions['question_type'].values()),
+        'distributions': distributions
+    })
+
+# Statistics page, drawn client-side unless server-rendered PNGs are requested
+@app.route('/check_statistic')
+@etag_on_data
+def check_statistic():
+    if request.args.get('render') != 'server':
+        return statistic_client_html
+
+    version, distributions = read_statistics(DATA_FILE)
+    
+    if not distributions or not distributions['question_type']:
+        return "<h2>No data found. Please check if questions_converted.jsonl exists.</h2>"
+    
+    if statistic_page_cache['version'] == version:
+        count('scalelong_cache_hits_total', cache='statistic_page')
+        return statistic_page_cache['html']
+    count('scalelong_cache_misses_total', cache='statistic_page')
+
+    images = dict(
+        video_image=render_bar_chart(
+            'video_type', distributions['video_type'],
+            "Video Types Distribution", "Video Type", 'skyblue'),
+        hierarchy_image=render_bar_chart(
+            'hierarchy', distributions['hierarchy'],
+            "Granularity Distribution", "Granularity", 'lightgreen'),
+        question_type_image=render_bar_chart(
+            'question_type', distributions['question_type'],
+            "Question Types Distribution", "Question Type", 'lightblue',
+            figsize=(10, 6), rotate_labels=True),
+        wrong_choice_design_image=render_bar_chart(
+            'wrong_choice_design', distributions['wrong_choice_design'],
+            "Question Format", "Format Type", 'orange'),
     )
+    with phase('html_render'):
+        page = statistic_html.format(**images)
+    statistic_page_cache['version'] = version
+    statistic_page_cache['html'] = page
+    return page
+
+# Write-behind flush status of this worker process
+@app.route('/api/save_status')
+def save_status():
+    if WRITE_BEHIND and STORAGE_ENGINE == 'jsonl':
+        return jsonify(get_question_store(DATA_FILE).write_behind_status())
+    return jsonify({'write_behind': False})
+
+# Prometheus metrics of this worker process
+@app.route('/metrics')
+def metrics():
+    gauges = {}
+    try:
+        gauges['scalelong_dataset_lines'] = ('Lines in the data file', get_question_store(DATA_FILE).line_count())
+        if os.path.isfile(DATA_FILE):
+            gauges['scalelong_dataset_bytes'] = ('Size of the data file in bytes', os.path.getsize(DATA_FILE))
+    except FileNotFoundError:
+        pass
+    if STORAGE_ENGINE == 'jsonl' and not os.path.isdir(DATA_FILE):
+        journal_path = DATA_FILE + JOURNAL_SUFFIX
+        journal_bytes = os.path.getsize(journal_path) if os.path.exists(journal_path) else 0
+        gauges['scalelong_journal_bytes'] = ('Size of the answer journal in bytes', journal_bytes)
+    if WRITE_BEHIND and STORAGE_ENGINE == 'jsonl':
+        status = get_question_store(DATA_FILE).write_behind_status()
+        gauges['scalelong_unflushed_edits'] = ('Acknowledged edits not written to disk yet', status['unflushed_edits'])
+        gauges['scalelong_flush_lag_seconds'] = ('Age of the oldest unflushed edit', status['flush_lag_ms'] / 1000)
+    return Response(request_metrics.render_prometheus(gauges), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
-    app.run(debug=True) 
\ No newline at end of file
+    # By default SIGTERM ends the process without running atexit handlers,
+    # which would lose edits write-behind has acknowledged but not flushed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    # The reloader's outer process kills the server process outright when it
+    # is stopped itself, so queued edits would never reach the disk
+    app.run(debug=True, use_reloader=not WRITE_BEHIND) 
\ No newline at end of file
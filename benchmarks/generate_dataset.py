@@ -0,0 +1,108 @@
+import argparse
+import os
+import random
+import string
+
+import json_codec
+
+# Synthetic data in the questions_converted.jsonl schema:
+# one video per line, video_key -> [{data_id, question, question_type, options A-D, answer}]
+
+QUESTION_TYPES = [
+    'Action Understanding',
+    'Causal Reasoning',
+    'Counting Problem',
+    'Information Summary',
+    'Objective Recognition',
+    'Information Inference',
+]
+SUBJECTS = ['Chinese athletes', 'Danish athletes', 'the referee', 'the coach', 'the audience', 'the goalkeeper']
+OBJECTS = ['badminton', 'gold medal', 'sports shoes', 'sports drink', 'scoreboard', 'towel', 'racket', 'jersey']
+COLORS = ['white', 'blue', 'yellow', 'black', 'green', 'red']
+
+SIZES = {'1k': 1_000, '100k': 100_000, '1M': 1_000_000}
+
+
+def video_key(rng):
+    return ''.join(rng.choice(string.ascii_letters + string.digits + '-_') for _ in range(11))
+
+
+def make_question(rng, data_id):
+    subject = rng.choice(SUBJECTS)
+    obj = rng.choice(OBJECTS)
+    colors = rng.sample(COLORS, 4)
+    return {
+        'data_id': data_id,
+        'question': f"What color {obj} did {subject} use when the score was {rng.randint(0, 21)}:{rng.randint(0, 21)}?",
+        'question_type': rng.choice(QUESTION_TYPES),
+        'options': {
+            choice: f"{subject} used a {color} {obj}."
+            for choice, color in zip('ABCD', colors)
+        },
+        'answer': rng.choice('ABCD'),
+    }
+
+
+def make_line(rng):
+    return {video_key(rng): [make_question(rng, data_id) for data_id in range(rng.randint(3, 10))]}
+
+
+def generate_questions_file(path, lines, seed=0):
+    """Write a questions_converted.jsonl-shaped file with the given number of lines"""
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as file:
+        for _ in range(lines):
+            file.write(json_codec.dumps(make_line(rng)) + '\n')
+
+
+def generate_annotation_dir(directory, data_path, range_size):
+    """Split a dataset into range files the way annotators hand them back.
+
+    File names alternate between the 1_45_1.jsonl and 91-135_2.jsonl styles
+    parse_filename_range understands. Some ranges get a _2 pass, some only a
+    _1 pass. Each file keeps the dataset's line numbering; lines before its
+    range are '{}' placeholders so files stay small.
+    """
+    os.makedirs(directory, exist_ok=True)
+    outputs = []
+    group = -1
+    with open(data_path, 'r', encoding='utf-8') as file:
+        for line_num, line in enumerate(file, 1):
+            if (line_num - 1) % range_size == 0:
+                for out in outputs:
+                    out.close()
+                group += 1
+                outputs = []
+                start, end = line_num, line_num + range_size - 1
+                separator = '-' if group % 2 else '_'
+                passes = [1, 2] if group % 3 == 0 else [1] if group % 3 == 1 else [2]
+                for annotation_pass in passes:
+                    name = f"{start}{separator}{end}_{annotation_pass}.jsonl"
+                    out = open(os.path.join(directory, name), 'w', encoding='utf-8')
+                    out.write('{}\n' * (start - 1))
+                    outputs.append(out)
+            for out in outputs:
+                out.write(line)
+    for out in outputs:
+        out.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic questions dataset')
+    parser.add_argument('--lines', default='1k', help=f"line count or one of {', '.join(SIZES)}")
+    parser.add_argument('--output', default='questions_converted.jsonl')
+    parser.add_argument('--annotation-dir', help='also write range files for merge_annotation_files here')
+    parser.add_argument('--range-size', type=int, default=45)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    lines = SIZES.get(args.lines) or int(args.lines)
+    generate_questions_file(args.output, lines, args.seed)
+    print(f"Wrote {lines} lines to {args.output}")
+    if args.annotation_dir:
+        generate_annotation_dir(args.annotation_dir, args.output, args.range_size)
+        print(f"Wrote range files to {args.annotation_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+
+from benchmarks.generate_dataset import SIZES, generate_annotation_dir, generate_questions_file
+
+# Every scenario runs in a fresh process so that its peak RSS is its own and
+# caches warmed by an earlier scenario do not flatter a later one.
+SCENARIOS = [
+    'annotate_10_lines',
+    'annotate_500_lines',
+    'update_answer',
+    'update_answers_batch',
+    'check_statistic',
+    'api_statistics',
+    'merge_annotation_files',
+]
+# Merge groups per dataset, independent of its size
+MERGE_GROUPS = 100
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies):
+    """Latency percentiles in milliseconds"""
+    values = sorted(latency * 1000 for latency in latencies)
+    return {
+        'iterations': len(values),
+        'first_ms': round(latencies[0] * 1000, 3),
+        'mean_ms': round(sum(values) / len(values), 3),
+        'p50_ms': round(percentile(values, 0.50), 3),
+        'p90_ms': round(percentile(values, 0.90), 3),
+        'p99_ms': round(percentile(values, 0.99), 3),
+        'max_ms': round(values[-1], 3),
+    }
+
+
+def peak_rss_kb(who=resource.RUSAGE_SELF):
+    """Peak RSS of this process, or with RUSAGE_CHILDREN of its largest finished child"""
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def timed_request(client, method, url, **kwargs):
+    start = time.perf_counter()
+    response = getattr(client, method)(url, **kwargs)
+    # Drain streamed bodies so the whole page is part of the measurement
+    response.get_data()
+    elapsed = time.perf_counter() - start
+    if response.status_code != 200:
+        raise RuntimeError(f"{method.upper()} {url} returned {response.status_code}")
+    return elapsed
+
+
+def run_scenario(name, data_dir, lines, iterations, seed):
+    """Run one scenario against the dataset in data_dir and return its measurements"""
+    os.chdir(data_dir)
+    rng = random.Random(seed)
+    latencies = []
+
+    if name == 'merge_annotation_files':
+        import merge_annotation_files
+
+        for i in range(max(1, iterations // 10)):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                merge_annotation_files.merge_annotation_files('annotation', f'merged_{i}.jsonl', incremental=False)
+            latencies.append(time.perf_counter() - start)
+        # The groups are parsed in pool workers, which have exited by now
+        children_peak = peak_rss_kb(resource.RUSAGE_CHILDREN)
+        return {**summarize(latencies), 'peak_rss_kb': max(peak_rss_kb(), children_peak),
+                'children_peak_rss_kb': children_peak}
+
+    import backend_simple
+
+    client = backend_simple.app.test_client()
+    if name.startswith('annotate_'):
+        span = int(name.split('_')[1])
+        for _ in range(iterations):
+            start_line = rng.randint(1, max(1, lines - span + 1))
+            latencies.append(timed_request(
+                client, 'get', f'/annotate?start_line={start_line}&end_line={start_line + span - 1}'))
+    elif name in ('update_answer', 'update_answers_batch'):
+        batch = 1 if name == 'update_answer' else 50
+        for _ in range(iterations):
+            edits = []
+            for _ in range(batch):
+                line_number = rng.randint(1, lines)
+                question = rng.choice(backend_simple.read_jsonl_file(backend_simple.DATA_FILE, line_number, line_number))
+                edits.append({
+                    'line_number': line_number,
+                    'video_key': question['video_key'],
+                    'data_id': question['data_id'],
+                    'correct_choice': rng.choice('ABCD'),
+                })
+            if batch == 1:
+                latencies.append(timed_request(client, 'post', '/update_answer', json=edits[0]))
+            else:
+                latencies.append(timed_request(client, 'post', '/update_answers', json={'edits': edits}))
+    elif name == 'check_statistic':
+        for _ in range(iterations):
+            latencies.append(timed_request(client, 'get', '/check_statistic?render=server'))
+    elif name == 'api_statistics':
+        for _ in range(iterations):
+            latencies.append(timed_request(client, 'get', '/api/statistics'))
+    else:
+        raise ValueError(f"Unknown scenario {name!r}")
+
+    return {**summarize(latencies), 'peak_rss_kb': peak_rss_kb()}
+
+
+def scenario_worker(results, *args):
+    try:
+        results.put(('ok', run_scenario(*args)))
+    except Exception as e:
+        results.put(('error', f"{type(e).__name__}: {e}"))
+
+
+def run_isolated(context, *args):
+    """Run a scenario in a fresh, non-daemon process (the merge spawns its own workers)"""
+    results = context.Queue()
+    process = context.Process(target=scenario_worker, args=(results, *args))
+    process.start()
+    status, result = results.get()
+    process.join()
+    if status != 'ok':
+        raise RuntimeError(result)
+    return result
+
+
+def prepare_dataset(data_root, size_name, lines):
+    """Generate (or reuse) the dataset and annotation directory for one size"""
+    data_dir = os.path.join(data_root, size_name)
+    data_path = os.path.join(data_dir, 'questions_converted.jsonl')
+    pristine_path = data_path + '.pristine'
+    annotation_dir = os.path.join(data_dir, 'annotation')
+    if not os.path.exists(pristine_path):
+        os.makedirs(data_dir, exist_ok=True)
+        generate_questions_file(pristine_path, lines)
+    if not os.path.isdir(annotation_dir):
+        generate_annotation_dir(annotation_dir, pristine_path, max(45, lines // MERGE_GROUPS))
+    return data_dir, data_path, pristine_path
+
+
+def reset_dataset(data_dir, data_path, pristine_path):
+    """Restore the untouched dataset and drop every sidecar file from earlier runs"""
+    for filename in os.listdir(data_dir):
+        if filename.startswith('questions_converted.jsonl.') and not filename.endswith('.pristine'):
+            os.remove(os.path.join(data_dir, filename))
+        elif filename.startswith('merged_'):
+            os.remove(os.path.join(data_dir, filename))
+    with open(pristine_path, 'rb') as src, open(data_path, 'wb') as dst:
+        while chunk := src.read(1024 * 1024):
+            dst.write(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the annotation backend and merge tool')
+    parser.add_argument('--sizes', default='1k', help=f"comma-separated sizes from {', '.join(SIZES)} or line counts")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--data-dir', help='where generated datasets are kept between runs (default: a temp dir)')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    data_root = os.path.abspath(args.data_dir or tempfile.mkdtemp(prefix='scalelong_bench_'))
+    # Workers are spawned fresh, so they need the repo on their import path
+    sys.path.insert(0, repo_root)
+    os.environ['PYTHONPATH'] = os.pathsep.join(filter(None, [repo_root, os.environ.get('PYTHONPATH')]))
+    context = multiprocessing.get_context('spawn')
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'iterations': args.iterations,
+            'environment': {key: value for key, value in os.environ.items() if key.startswith('SCALELONG_')},
+        },
+        'results': {},
+    }
+
+    for size_name in args.sizes.split(','):
+        lines = SIZES.get(size_name) or int(size_name)
+        print(f"Preparing {size_name} ({lines} lines) in {data_root}", file=sys.stderr)
+        data_dir, data_path, pristine_path = prepare_dataset(data_root, size_name, lines)
+        report['results'][size_name] = {'lines': lines, 'bytes': os.path.getsize(pristine_path)}
+
+        for scenario in args.scenarios.split(','):
+            reset_dataset(data_dir, data_path, pristine_path)
+            print(f"  {scenario}", file=sys.stderr)
+            report['results'][size_name][scenario] = run_isolated(
+                context, scenario, data_dir, lines, args.iterations, args.seed)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+import sys
+import threading
+from array import array
+
+import json_codec
+
+# Compact form of decoded JSONL lines for the question store's cache.
+#
+# A decoded line is a dict of video_key -> list of question dicts, which
+# for a million questions means millions of dicts and copies of the same
+# few strings. A CompactLine keeps one column per field the hot paths need:
+# the interned video_key and the data_id of every question, and
+# question_type and answer as small integers. Question and option text stay
+# in the data file and are decoded from the line's raw bytes (sliced from
+# the mmap in line_index.py) only when a caller asks for the question dicts.
+# The answer column is authoritative: the raw bytes may still carry answers
+# that were changed through the journal or a write-behind queue.
+
+
+class Categories:
+    """Interns the values of one categorical field as small integers"""
+
+    def __init__(self, values=()):
+        self.values = []
+        self._codes = {}
+        self._lock = threading.Lock()
+        for value in values:
+            self.code(value)
+
+    def code(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(value)
+                if code is None:
+                    code = len(self.values)
+                    self.values.append(value)
+                    self._codes[value] = code
+        return code
+
+
+# Shared by every store of the process; a missing field is 'Unknown', like in the statistics
+QUESTION_TYPES = Categories(['Unknown'])
+ANSWERS = Categories(['A', 'B', 'C', 'D', 'Unknown'])
+
+
+class CompactLine:
+    """Per-question columns of one non-blank JSONL line, in file order"""
+
+    __slots__ = ('video_keys', 'data_ids', 'question_types', 'answers')
+
+    def __init__(self, raw):
+        video_keys = []
+        data_ids = []
+        self.question_types = array('H')
+        self.answers = array('H')
+        for video_key, questions in json_codec.loads(raw).items():
+            video_key = sys.intern(video_key)
+            for question in questions:
+                video_keys.append(video_key)
+                data_ids.append(question.get('data_id'))
+                self.question_types.append(QUESTION_TYPES.code(question.get('question_type', 'Unknown')))
+                self.answers.append(ANSWERS.code(question.get('answer', 'Unknown')))
+        self.video_keys = tuple(video_keys)
+        self.data_ids = tuple(data_ids)
+
+    def __len__(self):
+        return len(self.answers)
+
+    def find(self, video_key, data_id):
+        """Position of the first question with this video_key and data_id, or None"""
+        for position, (key, question_id) in enumerate(zip(self.video_keys, self.data_ids)):
+            if question_id == data_id and key == video_key:
+                return position
+        return None
+
+    def position(self, video_key, video_position):
+        """Position of question number video_position of video_key in the line, or None"""
+        try:
+            position = self.video_keys.index(video_key) + video_position
+        except ValueError:
+            return None
+        if position < len(self.video_keys) and self.video_keys[position] == video_key:
+            return position
+        return None
+
+    def answer(self, position):
+        return ANSWERS.values[self.answers[position]]
+
+    def categories(self):
+        """Yield (question_type, answer) for every question"""
+        for question_type, answer in zip(self.question_types, self.answers):
+            yield QUESTION_TYPES.values[question_type], ANSWERS.values[answer]
+
+    def iter_answers(self):
+        for answer in self.answers:
+            yield ANSWERS.values[answer]
+
+    def apply_answers(self, answers):
+        """Apply {(video_key, data_id): answer}, returning the (old, new) answer of every question touched"""
+        changes = []
+        for (video_key, data_id), answer in answers.items():
+            position = self.find(video_key, data_id)
+            if position is not None:
+                changes.append((ANSWERS.values[self.answers[position]], answer))
+                self.answers[position] = ANSWERS.code(answer)
+        return changes
+
+    def decode(self, raw, answers=None):
+        """Return raw, this line's bytes in the data file, as a JSON object
+        with the current answers, and answers applied on top"""
+        codes = self.answers
+        if answers:
+            codes = array('H', codes)
+            for (video_key, data_id), answer in answers.items():
+                position = self.find(video_key, data_id)
+                if position is not None:
+                    codes[position] = ANSWERS.code(answer)
+        line_data = json_codec.loads(raw)
+        position = 0
+        for questions in line_data.values():
+            for question in questions:
+                # Untouched questions keep their JSON exactly, absent answer included
+                answer = ANSWERS.values[codes[position]]
+                if question.get('answer', 'Unknown') != answer:
+                    question['answer'] = answer
+                position += 1
+        return line_data
+
+    def questions(self, line_number, raw):
+        """Return the flattened question dicts of this line"""
+        return [
+            {'line_number': line_number, 'video_key': video_key, **question}
+            for video_key, questions in self.decode(raw).items()
+            for question in questions
+        ]
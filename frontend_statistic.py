@@ -26,4 +26,100 @@ statistic_html = """
     <a href="/">Back to Home</a>
 </body>
 </html>
-"""
\ No newline at end of file
+"""
+# Statistics page drawn in the browser from /api/statistics
+statistic_client_html = """
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Statistics</title>
+    <style>
+        .chart text {
+            font-family: Arial, sans-serif;
+            font-size: 12px;
+        }
+    </style>
+</head>
+<body>
+    <h1>Video Type Statistics</h1>
+    <div id="video_type" class="chart"></div>
+    <h1>Hierarchy Statistics</h1>
+    <div id="hierarchy" class="chart"></div>
+    <h1>Question Type Statistics</h1>
+    <div id="question_type" class="chart"></div>
+    <h1>Wrong Choice Design Statistics</h1>
+    <div id="wrong_choice_design" class="chart"></div>
+    <h1>Answer Statistics</h1>
+    <div id="answer" class="chart"></div>
+    <p id="status">Loading statistics...</p>
+    <a href="/">Back to Home</a> |
+    <a href="/check_statistic?render=server">Server-rendered charts</a>
+
+    <script>
+        const CHARTS = {
+            video_type: {title: 'Video Types Distribution', color: 'skyblue'},
+            hierarchy: {title: 'Granularity Distribution', color: 'lightgreen'},
+            question_type: {title: 'Question Types Distribution', color: 'lightblue'},
+            wrong_choice_design: {title: 'Question Format', color: 'orange'},
+            answer: {title: 'Answer Distribution', color: 'plum'}
+        };
+        const SVG_NS = 'http://www.w3.org/2000/svg';
+
+        function svgElement(name, attributes, text) {
+            const element = document.createElementNS(SVG_NS, name);
+            for (const [key, value] of Object.entries(attributes)) {
+                element.setAttribute(key, value);
+            }
+            if (text !== undefined) {
+                element.textContent = text;
+            }
+            return element;
+        }
+
+        function drawBarChart(container, counts, title, color) {
+            const labels = Object.keys(counts);
+            const maxCount = Math.max(1, ...Object.values(counts));
+            const barWidth = 80, gap = 30, chartHeight = 300, top = 40, bottom = 90, left = 50;
+            const width = left + labels.length * (barWidth + gap) + gap;
+            const svg = svgElement('svg', {width: Math.max(width, 400), height: top + chartHeight + bottom});
+
+            svg.appendChild(svgElement('text', {x: Math.max(width, 400) / 2, y: 20, 'text-anchor': 'middle', 'font-weight': 'bold'}, title));
+            svg.appendChild(svgElement('line', {x1: left, y1: top + chartHeight, x2: width, y2: top + chartHeight, stroke: '#333'}));
+
+            labels.forEach((label, i) => {
+                const height = counts[label] / maxCount * chartHeight;
+                const x = left + gap + i * (barWidth + gap);
+                svg.appendChild(svgElement('rect', {x: x, y: top + chartHeight - height, width: barWidth, height: height, fill: color}));
+                svg.appendChild(svgElement('text', {x: x + barWidth / 2, y: top + chartHeight - height - 5, 'text-anchor': 'middle'}, counts[label]));
+                svg.appendChild(svgElement('text', {
+                    x: x + barWidth / 2, y: top + chartHeight + 15, 'text-anchor': 'end',
+                    transform: `rotate(-30 ${x + barWidth / 2} ${top + chartHeight + 15})`
+                }, label));
+            });
+
+            container.appendChild(svg);
+        }
+
+        fetch('/api/statistics')
+            .then(response => response.json())
+            .then(data => {
+                const status = document.getElementById('status');
+                if (!data.success) {
+                    status.textContent = 'No data found. Please check if questions_converted.jsonl exists.';
+                    return;
+                }
+                for (const [name, chart] of Object.entries(CHARTS)) {
+                    drawBarChart(document.getElementById(name), data.distributions[name], chart.title, chart.color);
+                }
+                status.textContent = `${data.total} questions (data version ${data.version})`;
+            })
+            .catch(error => {
+                console.error('Error:', error);
+                document.getElementById('status').textContent = 'Network error';
+            });
+    </script>
+</body>
+</html>
+"""
@@ -0,0 +1,143 @@
+import json
+import os
+import sys
+import time
+
+# Fast JSON codec used for every JSONL line we read or write.
+#
+# loads() picks the fastest decoder available (orjson, ujson, stdlib) and
+# falls back to the stdlib on anything the fast decoder rejects, so callers
+# still see json.JSONDecodeError for bad input.
+#
+# dumps() must produce exactly json.dumps(obj, ensure_ascii=False) so the
+# data files stay diff-clean; a fast encoder is only used if it reproduces
+# the stdlib output byte for byte on PROBE_OBJECTS at import time.
+#
+# SCALELONG_JSON_CODEC=json forces the stdlib for both directions.
+
+# Objects covering everything our data files contain plus the usual edge cases
+PROBE_OBJECTS = [
+    {"uIj03RsGrJA": [{"data_id": 0, "question": "How many matches?", "question_type": "Counting Problem",
+                      "options": {"A": "three", "B": "four", "C": "six", "D": "five"}, "answer": "B"}]},
+    {"text": "中文 é ñ 😀    \x00\x1f\x7f \t\n\r \"quoted\" back\\slash / <tag> &amp;"},
+    {"numbers": [0, -1, 2 ** 53, 2 ** 63 - 1, 1.5, -0.0, 0.1, 1e16, 1e-7, 123456789.125]},
+    {"nested": {"list": [], "dict": {}, "none": None, "bools": [True, False]}, "": ""},
+]
+
+
+def stdlib_loads(text):
+    return json.loads(text)
+
+
+def stdlib_dumps(obj):
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def available_codecs():
+    """Return {name: (loads, dumps)} for every installed codec, stdlib last"""
+    codecs = {}
+    try:
+        import orjson
+
+        codecs['orjson'] = (
+            orjson.loads,
+            # orjson has no spacing options, so it never passes the probe
+            lambda obj: orjson.dumps(obj).decode('utf-8'),
+        )
+    except ImportError:
+        pass
+    try:
+        import ujson
+
+        codecs['ujson'] = (
+            ujson.loads,
+            lambda obj: ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False,
+                                    separators=(', ', ': ')),
+        )
+    except ImportError:
+        pass
+    codecs['json'] = (stdlib_loads, stdlib_dumps)
+    return codecs
+
+
+def matches_stdlib(codec_loads, codec_dumps):
+    """Check a codec decodes and encodes PROBE_OBJECTS exactly like the stdlib"""
+    for obj in PROBE_OBJECTS:
+        text = stdlib_dumps(obj)
+        try:
+            if codec_loads(text) != obj or codec_dumps(obj) != text:
+                return False
+        except Exception:
+            return False
+    return True
+
+
+def matches_stdlib_decode(codec_loads):
+    for obj in PROBE_OBJECTS:
+        try:
+            if codec_loads(stdlib_dumps(obj)) != obj:
+                return False
+        except Exception:
+            return False
+    return True
+
+
+def select_codecs():
+    """Pick the fastest acceptable decoder and encoder"""
+    if os.environ.get('SCALELONG_JSON_CODEC') == 'json':
+        return 'json', stdlib_loads, 'json', stdlib_dumps
+
+    codecs = available_codecs()
+    decoder_name = next(name for name, (codec_loads, _) in codecs.items() if matches_stdlib_decode(codec_loads))
+    encoder_name = next(name for name, (codec_loads, codec_dumps) in codecs.items()
+                        if matches_stdlib(codec_loads, codec_dumps))
+    return decoder_name, codecs[decoder_name][0], encoder_name, codecs[encoder_name][1]
+
+
+DECODER, _fast_loads, ENCODER, dumps = select_codecs()
+
+
+def loads(text):
+    """Decode one JSON document, raising json.JSONDecodeError on bad input"""
+    try:
+        return _fast_loads(text)
+    except ValueError:
+        # Let the stdlib decide: it raises the usual JSONDecodeError, and
+        # accepts the few inputs (NaN, huge ints) fast decoders refuse
+        return json.loads(text)
+
+
+def benchmark_codecs(filepath, repeat=3):
+    """Time decoding and encoding every line of filepath with each installed codec.
+
+    Returns {codec: {'decode_seconds', 'encode_seconds', 'identical'}}, where
+    identical tells whether the codec's output matched the stdlib on this file.
+    """
+    with open(filepath, 'r', encoding='utf-8') as file:
+        lines = [line.strip() for line in file if line.strip()]
+    objects = [json.loads(line) for line in lines]
+    expected = [stdlib_dumps(obj) for obj in objects]
+
+    results = {}
+    for name, (codec_loads, codec_dumps) in available_codecs().items():
+        decode_seconds = min(timed(lambda: [codec_loads(line) for line in lines]) for _ in range(repeat))
+        encode_seconds = min(timed(lambda: [codec_dumps(obj) for obj in objects]) for _ in range(repeat))
+        results[name] = {
+            'decode_seconds': decode_seconds,
+            'encode_seconds': encode_seconds,
+            'identical': [codec_dumps(obj) for obj in objects] == expected,
+        }
+    return results
+
+
+def timed(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    # python json_codec.py questions_converted.jsonl
+    data_file = sys.argv[1] if len(sys.argv) > 1 else 'questions_converted.jsonl'
+    print(f"Selected decoder: {DECODER}, encoder: {ENCODER}")
+    print(json.dumps(benchmark_codecs(data_file), indent=2))
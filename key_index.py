@@ -0,0 +1,162 @@
+import os
+import time
+
+import json_codec
+
+# Sidecar file mapping every video_key to the line(s) it is on and the
+# data_ids of its questions in order (questions_converted.jsonl.keys).
+#
+# Answer edits never move a question, so after writing the data file the
+# question store only stamps the new size and mtime into the fixed-width
+# header instead of rewriting the whole index. Any other change to the file
+# makes the stamp stale and the index is rebuilt.
+KEY_INDEX_SUFFIX = '.keys'
+KEY_INDEX_FORMAT = 1
+HEADER_BYTES = 256
+
+
+class KeyIndex:
+    """video_key -> [(line_number, data_ids)] for one JSONL file"""
+
+    def __init__(self, filepath, videos, size, mtime_ns, generation):
+        self.filepath = filepath
+        self.videos = videos
+        self.size = size
+        self.mtime_ns = mtime_ns
+        # Identifies one build, so processes sharing the sidecar know whether
+        # a re-stamped header still describes the index they have in memory
+        self.generation = generation
+
+    def matches(self, stat):
+        return stat.st_size == self.size and stat.st_mtime_ns == self.mtime_ns
+
+    def video_lines(self, video_key):
+        """Line numbers holding video_key, in file order"""
+        return [line_number for line_number, _ in self.videos.get(video_key, ())]
+
+    def position(self, line_number, video_key, data_id):
+        """Index of the question in line_data[video_key], or None if it is not there"""
+        for video_line, data_ids in self.videos.get(video_key, ()):
+            if video_line == line_number:
+                try:
+                    return data_ids.index(data_id)
+                except ValueError:
+                    return None
+        return None
+
+    def save(self):
+        """Write the whole index to its sidecar file, ignoring read-only directories"""
+        index_path = self.filepath + KEY_INDEX_SUFFIX
+        entries = [
+            [line_number, video_key, list(data_ids)]
+            for video_key, occurrences in self.videos.items()
+            for line_number, data_ids in occurrences
+        ]
+        tmp_path = f'{index_path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as file:
+                file.write(encode_header(self.size, self.mtime_ns, self.generation))
+                file.write(json_codec.dumps(entries).encode('utf-8'))
+            os.replace(tmp_path, index_path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def encode_header(size, mtime_ns, generation):
+    header = json_codec.dumps({
+        'format': KEY_INDEX_FORMAT,
+        'size': size,
+        'mtime_ns': mtime_ns,
+        'generation': generation,
+    })
+    return header.ljust(HEADER_BYTES - 1).encode('utf-8') + b'\n'
+
+
+def build_key_index(filepath):
+    """Decode the file once and record where every video and question is"""
+    stat = os.stat(filepath)
+    videos = {}
+    with open(filepath, 'r', encoding='utf-8') as file:
+        for line_num, line in enumerate(file, 1):
+            line = line.strip()
+            if not line:
+                continue
+            for video_key, questions in json_codec.loads(line).items():
+                data_ids = tuple(question.get('data_id') for question in questions)
+                videos.setdefault(video_key, []).append((line_num, data_ids))
+    return KeyIndex(filepath, videos, stat.st_size, stat.st_mtime_ns, time.time_ns())
+
+
+def read_key_index_header(filepath):
+    try:
+        with open(filepath + KEY_INDEX_SUFFIX, 'rb') as file:
+            header = json_codec.loads(file.read(HEADER_BYTES))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(header, dict) or header.get('format') != KEY_INDEX_FORMAT:
+        return None
+    return header
+
+
+def load_key_index(filepath):
+    """Load the sidecar index if it is still valid, otherwise rebuild it"""
+    stat = os.stat(filepath)
+    header = read_key_index_header(filepath)
+    if header is not None and header.get('size') == stat.st_size and header.get('mtime_ns') == stat.st_mtime_ns:
+        try:
+            with open(filepath + KEY_INDEX_SUFFIX, 'rb') as file:
+                file.seek(HEADER_BYTES)
+                entries = json_codec.loads(file.read())
+            videos = {}
+            for line_number, video_key, data_ids in entries:
+                videos.setdefault(video_key, []).append((line_number, tuple(data_ids)))
+            return KeyIndex(filepath, videos, stat.st_size, stat.st_mtime_ns, header['generation'])
+        except (OSError, ValueError, KeyError):
+            pass
+
+    index = build_key_index(filepath)
+    index.save()
+    return index
+
+
+# Indexes already loaded by this process, keyed by data file path
+_loaded_indexes = {}
+
+
+def get_key_index(filepath):
+    """Return an up-to-date index for filepath, reusing the loaded one when possible"""
+    stat = os.stat(filepath)
+    index = _loaded_indexes.get(filepath)
+    if index is not None and not index.matches(stat):
+        # Another process may have re-stamped our build after an answer edit
+        header = read_key_index_header(filepath)
+        if (header is not None and header.get('generation') == index.generation
+                and header.get('size') == stat.st_size and header.get('mtime_ns') == stat.st_mtime_ns):
+            index.size, index.mtime_ns = stat.st_size, stat.st_mtime_ns
+        else:
+            index = None
+    if index is None:
+        index = load_key_index(filepath)
+        _loaded_indexes[filepath] = index
+    return index
+
+
+def restamp_key_index(filepath, old_stat, new_stat):
+    """Carry an index that was valid for old_stat over to new_stat.
+
+    Only for writes that change answers and nothing else. Updates both the
+    sidecar header and this process's loaded copy, without loading anything.
+    """
+    header = read_key_index_header(filepath)
+    if header is not None and header.get('size') == old_stat.st_size and header.get('mtime_ns') == old_stat.st_mtime_ns:
+        try:
+            with open(filepath + KEY_INDEX_SUFFIX, 'r+b') as file:
+                file.write(encode_header(new_stat.st_size, new_stat.st_mtime_ns, header['generation']))
+        except OSError:
+            pass
+    index = _loaded_indexes.get(filepath)
+    if index is not None and index.matches(old_stat):
+        index.size, index.mtime_ns = new_stat.st_size, new_stat.st_mtime_ns
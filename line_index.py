@@ -0,0 +1,139 @@
+import json
+import mmap
+import os
+from array import array
+
+# Sidecar file holding the byte offset of every line of a JSONL file.
+# It sits next to the data file (questions_converted.jsonl.idx) and is
+# rebuilt whenever the data file's size or mtime no longer match.
+#
+# Lines are read through a read-only mmap of the data file, so every worker
+# process shares the OS page cache instead of holding its own copy, and a
+# read only touches the pages of the lines it slices out. Writers always
+# replace the file with a new one (safe_io.atomic_write), which leaves an
+# existing mapping valid; truncating the data file in place would not.
+INDEX_SUFFIX = '.idx'
+INDEX_FORMAT = 1
+
+
+class LineIndex:
+    """Byte offsets of the lines in a JSONL file"""
+
+    def __init__(self, filepath, offsets, size, mtime_ns):
+        self.filepath = filepath
+        # offsets[i] is where line i+1 starts, offsets[-1] is the end of file
+        self.offsets = offsets
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self._map = None
+        self._map_stamp = None  # (size, mtime_ns) of the file _map was made from
+
+    @property
+    def line_count(self):
+        return len(self.offsets) - 1
+
+    def matches(self, stat):
+        """Check whether the index still describes the file with this stat"""
+        return stat.st_size == self.size and stat.st_mtime_ns == self.mtime_ns
+
+    def _mapping(self):
+        """Return the mmap of the data file, mapping it again after a write replaced it"""
+        if self._map_stamp != (self.size, self.mtime_ns):
+            # The old mapping is closed once no caller holds it any more
+            self._map = None
+            if self.size:
+                with open(self.filepath, 'rb') as file:
+                    self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._map_stamp = (self.size, self.mtime_ns)
+        return self._map
+
+    def line_bytes(self, line_num):
+        """Return the raw bytes of one line, newline included"""
+        mapping = self._mapping()
+        if mapping is None:
+            return b''
+        return mapping[self.offsets[line_num - 1]:self.offsets[line_num]]
+
+    def read_lines(self, start_line, end_line):
+        """Yield (line_number, raw bytes) for lines start_line..end_line only"""
+        start_line = max(start_line, 1)
+        end_line = min(end_line, self.line_count)
+        for line_num in range(start_line, end_line + 1):
+            yield line_num, self.line_bytes(line_num)
+
+    def replace_line(self, line_num, new_length, stat):
+        """Shift the offsets after a line whose length changed in place"""
+        delta = new_length - (self.offsets[line_num] - self.offsets[line_num - 1])
+        if delta:
+            for i in range(line_num, len(self.offsets)):
+                self.offsets[i] += delta
+        self.size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+
+    def save(self):
+        """Write the index to its sidecar file, ignoring read-only directories"""
+        index_path = self.filepath + INDEX_SUFFIX
+        header = {
+            'format': INDEX_FORMAT,
+            'size': self.size,
+            'mtime_ns': self.mtime_ns,
+            'count': len(self.offsets),
+        }
+        tmp_path = f'{index_path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as file:
+                file.write(json.dumps(header).encode('utf-8') + b'\n')
+                self.offsets.tofile(file)
+            os.replace(tmp_path, index_path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def build_line_index(filepath):
+    """Scan the file once and record where every line starts"""
+    stat = os.stat(filepath)
+    offsets = array('Q')
+    position = 0
+    with open(filepath, 'rb') as file:
+        for line in file:
+            offsets.append(position)
+            position += len(line)
+    offsets.append(position)
+    return LineIndex(filepath, offsets, stat.st_size, stat.st_mtime_ns)
+
+
+def load_line_index(filepath):
+    """Load the sidecar index if it is still valid, otherwise rebuild it"""
+    stat = os.stat(filepath)
+    index_path = filepath + INDEX_SUFFIX
+    try:
+        with open(index_path, 'rb') as file:
+            header = json.loads(file.readline())
+            if (header.get('format') == INDEX_FORMAT
+                    and header['size'] == stat.st_size
+                    and header['mtime_ns'] == stat.st_mtime_ns):
+                offsets = array('Q')
+                offsets.fromfile(file, header['count'])
+                return LineIndex(filepath, offsets, stat.st_size, stat.st_mtime_ns)
+    except (OSError, ValueError, KeyError, EOFError):
+        pass
+
+    index = build_line_index(filepath)
+    index.save()
+    return index
+
+
+# Indexes already loaded by this process, keyed by data file path
+_loaded_indexes = {}
+
+
+def get_line_index(filepath):
+    """Return an up-to-date index for filepath, reusing the loaded one when possible"""
+    index = _loaded_indexes.get(filepath)
+    if index is None or not index.matches(os.stat(filepath)):
+        index = load_line_index(filepath)
+        _loaded_indexes[filepath] = index
+    return index
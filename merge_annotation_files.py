@@ -1,7 +1,19 @@
+import filecmp
+import hashlib
+import itertools
 import json
 import os
 import re
-from collections import defaultdict
+import sys
+import tempfile
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import json_codec
+
+# 增量合并时记录每个行号范围组来源和输出位置的文件 (output_file.manifest.json)
+MANIFEST_SUFFIX = '.manifest.json'
+MANIFEST_FORMAT = 4
 
 def parse_filename_range(filename):
     """
@@ -29,18 +41,13 @@ def parse_filename_range(filename):
     
     return None, None
 
-def merge_annotation_files(annotation_dir, output_file):
+def group_annotation_files(annotation_dir):
     """
-    合并annotation目录下的所有文件
-    优先使用_2文件，如果不存在则使用_1文件
+    按行号范围分组annotation目录下的所有jsonl文件
     
-    Args:
-        annotation_dir (str): annotation目录路径
-        output_file (str): 输出文件路径
+    Returns:
+        dict: {(start_line, end_line): [文件名, ...]}
     """
-    # 存储所有数据，按行号索引
-    all_data = {}
-    
     # 获取所有jsonl文件
     all_files = [f for f in os.listdir(annotation_dir) if f.endswith('.jsonl')]
     
@@ -52,82 +59,347 @@ def merge_annotation_files(annotation_dir, output_file):
             key = (start_line, end_line)
             file_groups[key].append(filename)
     
+    return file_groups
+
+def pick_group_file(files):
+    """
+    从同一行号范围组的文件中选出要使用的文件
+    优先选择_2文件，如果没有则选择_1文件，都没有则返回None
+    """
+    for suffix in ('_2.jsonl', '_1.jsonl'):
+        for filename in files:
+            if filename.endswith(suffix):
+                return filename
+    return None
+
+def select_group_files(annotation_dir):
+    """
+    按行号范围分组annotation目录下的文件，并为每组选出要使用的文件
+    优先使用_2文件，如果不存在则使用_1文件
+    
+    Returns:
+        list: 按行号排序的 (start_line, end_line, target_file) 列表
+    """
+    file_groups = group_annotation_files(annotation_dir)
+    
     print(f"找到 {len(file_groups)} 个行号范围组:")
     for (start, end), files in sorted(file_groups.items()):
         print(f"  行号范围 {start}-{end}: {files}")
     
-    # 处理每个行号范围
+    selected = []
     for (start_line, end_line), files in sorted(file_groups.items()):
-        print(f"\n处理行号范围: {start_line}-{end_line}")
-        
-        # 优先选择_2文件，如果没有则选择_1文件
-        target_file = None
-        for filename in files:
-            if filename.endswith('_2.jsonl'):
-                target_file = filename
-                break
-        
-        if target_file is None:
-            for filename in files:
-                if filename.endswith('_1.jsonl'):
-                    target_file = filename
-                    break
-        
+        target_file = pick_group_file(files)
         if target_file is None:
             print(f"  警告: 行号范围 {start_line}-{end_line} 没有找到合适的文件")
             continue
         
-        print(f"  使用文件: {target_file}")
+        selected.append((start_line, end_line, target_file))
+    
+    return selected
+
+def extract_group(file_path, start_line, end_line):
+    """
+    在工作进程中读取一个文件的指定行号范围，只读到end_line为止
+    
+    Returns:
+        tuple: ([(行号, 输出行文本)], [提示信息])
+    """
+    lines = []
+    messages = []
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            # 跳过start_line之前的行且不解析，读到end_line就停止
+            window = itertools.islice(f, start_line - 1, end_line)
+            for i, line in enumerate(window, start_line):
+                try:
+                    data = json_codec.loads(line.strip())
+                    lines.append((i, json_codec.dumps(data) + '\n'))
+                except json.JSONDecodeError as e:
+                    messages.append(f"  警告: 第{i}行JSON解析错误: {e}")
+                    continue
+    except Exception as e:
+        messages.append(f"  错误: 处理文件 {os.path.basename(file_path)} 时出错: {e}")
+        return None, messages
+    
+    return lines, messages
+
+def iter_extracted_groups(annotation_dir, groups, workers=None):
+    """
+    用进程池并行解析各组，按行号顺序依次产出结果
+    同时最多只有 workers*2 个组的数据在内存中
+    """
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        groups = iter(groups)
         
-        file_path = os.path.join(annotation_dir, target_file)
+        def submit_next():
+            group = next(groups, None)
+            if group is not None:
+                start_line, end_line, target_file = group
+                file_path = os.path.join(annotation_dir, target_file)
+                pending.append((group, executor.submit(extract_group, file_path, start_line, end_line)))
         
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-                
-            # 提取指定行号范围的数据
-            extracted_count = 0
-            for i, line in enumerate(lines, 1):
-                if start_line <= i <= end_line:
-                    try:
-                        data = json.loads(line.strip())
-                        all_data[i] = data
-                        extracted_count += 1
-                    except json.JSONDecodeError as e:
-                        print(f"  警告: 第{i}行JSON解析错误: {e}")
-                        continue
-            
-            print(f"  提取了 {extracted_count} 行数据")
-            
-        except Exception as e:
-            print(f"  错误: 处理文件 {target_file} 时出错: {e}")
-            continue
+        for _ in range(workers * 2):
+            submit_next()
+        
+        while pending:
+            group, future = pending.popleft()
+            submit_next()
+            yield group, future.result()
+
+def file_sha256(file_path):
+    """计算文件内容的sha256"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_manifest(output_file):
+    """
+    读取上次合并留下的manifest (output_file.manifest.json)
+    只有当输出文件与manifest记录的大小和修改时间一致时才可用，否则返回空字典
+    
+    Returns:
+        dict: {(start_line, end_line): 该组的记录}
+    """
+    try:
+        with open(output_file + MANIFEST_SUFFIX, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        stat = os.stat(output_file)
+        if (manifest.get('format') != MANIFEST_FORMAT
+                or manifest['output_size'] != stat.st_size
+                or manifest['output_mtime_ns'] != stat.st_mtime_ns):
+            return {}
+        return {(entry['start'], entry['end']): entry for entry in manifest['groups']}
+    except (OSError, ValueError, KeyError):
+        return {}
+
+def source_unchanged(annotation_dir, group, entry):
+    """判断某组的源文件与manifest记录相比是否没有变化"""
+    start_line, end_line, target_file = group
+    if entry is None or entry['source'] != target_file:
+        return False
+    file_path = os.path.join(annotation_dir, target_file)
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return False
+    if stat.st_size != entry['size']:
+        return False
+    if stat.st_mtime_ns == entry['mtime_ns']:
+        return True
+    # 修改时间变了但内容可能没变，用内容哈希确认
+    return file_sha256(file_path) == entry['sha256']
+
+def line_runs(line_numbers):
+    """把递增的行号列表压缩成 [[起始, 结束], ...] 区间"""
+    runs = []
+    for line_num in line_numbers:
+        if runs and runs[-1][1] == line_num - 1:
+            runs[-1][1] = line_num
+        else:
+            runs.append([line_num, line_num])
+    return runs
+
+def merge_annotation_files(annotation_dir, output_file, workers=None, incremental=True):
+    """
+    合并annotation目录下的所有文件
+    优先使用_2文件，如果不存在则使用_1文件
+    行号范围重叠时，每一行取自覆盖它且确实提供了这一行的最后一组（与逐组覆盖写入的结果相同），
+    后面的组超出文件长度或解析失败的行仍使用前面的组
+    各组在进程池中并行解析，并按行号顺序边处理边写入输出文件
+    
+    增量模式下会读取上次合并的manifest，源文件没有变化的组直接从旧的输出文件
+    中按字节偏移复制对应片段，只重新解析发生变化的组
+    
+    Args:
+        annotation_dir (str): annotation目录路径
+        output_file (str): 输出文件路径
+        workers (int): 并行进程数，默认为CPU核数
+        incremental (bool): 是否复用上次合并的结果
+    """
+    groups = select_group_files(annotation_dir)
+    
+    manifest = load_manifest(output_file) if incremental else {}
+    reusable = {
+        (start_line, end_line) for start_line, end_line, target_file in groups
+        if source_unchanged(annotation_dir, (start_line, end_line, target_file), manifest.get((start_line, end_line)))
+    }
+    changed_groups = [group for group in groups if (group[0], group[1]) not in reusable]
+    print(f"\n{len(reusable)} 个行号范围组没有变化，{len(changed_groups)} 个需要重新处理")
+    extracted = iter_extracted_groups(annotation_dir, changed_groups, workers)
+    
+    # 边处理边写入，只记录统计所需的信息
+    total_lines = 0
+    first_line = None
+    last_line = None
+    missing_lines = []
+    provided = [[] for _ in groups]  # 每组提供的行号区间
+    owned = [[] for _ in groups]  # 每组在输出中占有的 [起始行, 结束行, 字节偏移, 字节长度]
+    # 还可能被后面的组覆盖的行: 行号 -> (组序号, 输出行字节)，字节为None时从旧输出或源文件取
+    pending = {}
+    reextracted = {}
     
-    # 按行号排序并写入输出文件
     print(f"\n开始写入合并文件: {output_file}")
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        for line_num in sorted(all_data.keys()):
-            f.write(json.dumps(all_data[line_num], ensure_ascii=False) + '\n')
+    old_output = open(output_file, 'rb') if reusable else None
+    
+    def reused_lines(index, first, last):
+        """没有变化的组第first到last行的字节，优先从旧输出复制"""
+        start_line, end_line, target_file = groups[index]
+        for run_first, run_last, offset, length in manifest[(start_line, end_line)]['owned']:
+            if run_first <= first and last <= run_last:
+                old_output.seek(offset)
+                segment = old_output.read(length)
+                if (run_first, run_last) == (first, last):
+                    return segment
+                return b''.join(segment.splitlines(keepends=True)[first - run_first:last - run_first + 1])
+        # 上次这些行由其他组提供，从源文件重新解析
+        if index not in reextracted:
+            lines, _ = extract_group(os.path.join(annotation_dir, target_file), start_line, end_line)
+            reextracted[index] = {line_num: text.encode('utf-8') for line_num, text in lines or []}
+        return b''.join(reextracted[index][line_num] for line_num in range(first, last + 1))
+    
+    def write_lines(out, before=None):
+        """按行号顺序写出before之前的所有行，后面的组都从before开始，不会再覆盖它们"""
+        nonlocal total_lines, first_line, last_line
+        ready = sorted(line_num for line_num in pending if before is None or line_num < before)
+        runs = []
+        for line_num in ready:
+            index = pending[line_num][0]
+            if runs and runs[-1][0] == index and runs[-1][2] == line_num - 1:
+                runs[-1][2] = line_num
+            else:
+                runs.append([index, line_num, line_num])
+        for index, first, last in runs:
+            if pending[first][1] is None:
+                segment = reused_lines(index, first, last)
+            else:
+                segment = b''.join(pending[line_num][1] for line_num in range(first, last + 1))
+            runs_of_group = owned[index]
+            if runs_of_group and runs_of_group[-1][1] == first - 1 and sum(runs_of_group[-1][2:]) == out.tell():
+                runs_of_group[-1][1] = last
+                runs_of_group[-1][3] += len(segment)
+            else:
+                runs_of_group.append([first, last, out.tell(), len(segment)])
+            out.write(segment)
+        for line_num in ready:
+            del pending[line_num]
+            if last_line is not None:
+                missing_lines.extend(range(last_line + 1, line_num))
+            if first_line is None:
+                first_line = line_num
+            last_line = line_num
+        total_lines += len(ready)
+    
+    # 每次合并使用独立的临时文件，同时运行的合并不会互相覆盖
+    fd, tmp_file = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(output_file)), prefix=os.path.basename(output_file) + '.', suffix='.tmp'
+    )
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for index, (start_line, end_line, target_file) in enumerate(groups):
+                write_lines(out, before=start_line)
+                print(f"\n处理行号范围: {start_line}-{end_line}")
+                if (start_line, end_line) in reusable:
+                    # 源文件没有变化：不做JSON解析，写出时直接复制旧输出中的字节
+                    print(f"  复用上次合并结果: {target_file}")
+                    provided[index] = manifest[(start_line, end_line)]['line_runs']
+                    for run_first, run_last in provided[index]:
+                        for line_num in range(run_first, run_last + 1):
+                            pending[line_num] = (index, None)
+                else:
+                    _, (lines, messages) = next(extracted)
+                    print(f"  使用文件: {target_file}")
+                    for message in messages:
+                        print(message)
+                    for line_num, text in lines or []:
+                        pending[line_num] = (index, text.encode('utf-8'))
+                    provided[index] = line_runs([line_num for line_num, _ in lines or []])
+                print(f"  提取了 {sum(run_last - run_first + 1 for run_first, run_last in provided[index])} 行数据")
+            write_lines(out)
+        # mkstemp只给所有者读写权限，保持输出文件原来的权限
+        try:
+            os.chmod(tmp_file, os.stat(output_file).st_mode & 0o7777)
+        except FileNotFoundError:
+            os.chmod(tmp_file, 0o644)
+        os.replace(tmp_file, output_file)
+    finally:
+        extracted.close()
+        if old_output is not None:
+            old_output.close()
+        # 出错时删除写了一半的临时文件
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    
+    manifest_groups = []
+    for index, (start_line, end_line, target_file) in enumerate(groups):
+        file_path = os.path.join(annotation_dir, target_file)
+        stat = os.stat(file_path)
+        entry = manifest.get((start_line, end_line))
+        manifest_groups.append({
+            'start': start_line,
+            'end': end_line,
+            'source': target_file,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': entry['sha256'] if (start_line, end_line) in reusable else file_sha256(file_path),
+            'line_runs': provided[index],
+            'owned': owned[index],
+        })
     
-    print(f"合并完成！总共处理了 {len(all_data)} 行数据")
+    # 记录本次合并的manifest，供下次增量合并使用
+    stat = os.stat(output_file)
+    with open(output_file + MANIFEST_SUFFIX, 'w', encoding='utf-8') as f:
+        json.dump({
+            'format': MANIFEST_FORMAT,
+            'output_size': stat.st_size,
+            'output_mtime_ns': stat.st_mtime_ns,
+            'groups': manifest_groups,
+        }, f, ensure_ascii=False)
+    
+    print(f"合并完成！总共处理了 {total_lines} 行数据")
     print(f"输出文件: {output_file}")
     
     # 显示统计信息
     print(f"\n=== 统计信息 ===")
-    print(f"总行数: {len(all_data)}")
-    print(f"行号范围: {min(all_data.keys())} - {max(all_data.keys())}")
+    print(f"总行数: {total_lines}")
+    if first_line is None:
+        return
+    print(f"行号范围: {first_line} - {last_line}")
     
     # 检查是否有缺失的行号
-    expected_lines = set(range(min(all_data.keys()), max(all_data.keys()) + 1))
-    actual_lines = set(all_data.keys())
-    missing_lines = expected_lines - actual_lines
-    
     if missing_lines:
-        print(f"缺失的行号: {sorted(missing_lines)}")
+        print(f"缺失的行号: {missing_lines}")
     else:
         print("所有行号都已包含")
 
+def verify_incremental_merge(annotation_dir, output_file, workers=None):
+    """
+    完整重新合并到临时文件，检查增量合并的输出与之逐字节相同
+    
+    Returns:
+        bool: 是否相同
+    """
+    fd, rebuilt_file = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(output_file)), prefix=os.path.basename(output_file) + '.', suffix='.rebuilt'
+    )
+    os.close(fd)
+    try:
+        merge_annotation_files(annotation_dir, rebuilt_file, workers, incremental=False)
+        same = filecmp.cmp(output_file, rebuilt_file, shallow=False)
+    finally:
+        for path in (rebuilt_file, rebuilt_file + MANIFEST_SUFFIX):
+            if os.path.exists(path):
+                os.remove(path)
+    if same:
+        print("\n校验通过: 增量合并结果与完整重新合并相同")
+    else:
+        print("\n校验失败: 增量合并结果与完整重新合并不同，请使用 incremental=False 重新合并")
+    return same
+
 def show_sample_data(output_file, num_samples=3):
     """
     显示合并后文件的样本数据
@@ -144,7 +416,7 @@ def show_sample_data(output_file, num_samples=3):
                 if i > num_samples:
                     break
                 
-                data = json.loads(line.strip())
+                data = json_codec.loads(line.strip())
                 video_id = list(data.keys())[0]
                 questions = data[video_id]
                 
@@ -163,5 +435,9 @@ if __name__ == "__main__":
     # 执行合并
     merge_annotation_files(annotation_dir, output_file)
     
+    # python merge_annotation_files.py --verify 额外检查增量合并结果与完整重新合并相同
+    if '--verify' in sys.argv:
+        verify_incremental_merge(annotation_dir, output_file)
+    
     # 显示样本数据
     show_sample_data(output_file, num_samples=3)
\ No newline at end of file
@@ -0,0 +1,260 @@
+import json
+import os
+import time
+from array import array
+from bisect import bisect_left, insort
+
+import json_codec
+
+# Posting lists from question_type and answer to the positions of the
+# questions that have them, kept next to the data file
+# (questions_converted.jsonl.postings).
+#
+# A position packs (line_number, index of the question within its line)
+# into one integer, so every list is a sorted array('Q') in file order and
+# a filtered page is a bisect plus a walk over matching entries only.
+#
+# Layout: a fixed-width header line (data file stamp, where the change log
+# starts and how long it is), a directory line, the arrays, then a change
+# log of [position, answer] records. Answer writes append to the log and
+# re-stamp the header instead of rewriting the arrays.
+POSTING_INDEX_SUFFIX = '.postings'
+POSTING_INDEX_FORMAT = 1
+HEADER_BYTES = 256
+POSITION_BITS = 16
+# Fold the change log into the arrays once it grows past this
+MAX_LOG_BYTES = 1024 * 1024
+
+
+def encode_position(line_number, position):
+    return (line_number << POSITION_BITS) | position
+
+
+def decode_position(code):
+    return code >> POSITION_BITS, code & ((1 << POSITION_BITS) - 1)
+
+
+class PostingIndex:
+    """question_type -> positions and answer -> positions for one JSONL file"""
+
+    def __init__(self, filepath, question_types, answers, size, mtime_ns, generation, log_offset=None, log_bytes=0):
+        self.filepath = filepath
+        self.question_types = question_types
+        self.answers = answers
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.generation = generation
+        # Where this build's change log starts in the sidecar and how much of it is applied
+        self.log_offset = log_offset
+        self.log_bytes = log_bytes
+        # (position, answer) changes not written to the sidecar yet
+        self.pending = []
+
+    def matches(self, stat):
+        return stat.st_size == self.size and stat.st_mtime_ns == self.mtime_ns
+
+    def set_answer(self, code, answer, record=True):
+        """Move the question at code to the posting list of answer"""
+        for value, postings in self.answers.items():
+            i = bisect_left(postings, code)
+            if i < len(postings) and postings[i] == code:
+                if value == answer:
+                    return
+                del postings[i]
+                break
+        insort(self.answers.setdefault(answer, array('Q')), code)
+        if record:
+            self.pending.append((code, answer))
+
+    def iter_matches(self, question_type=None, answer=None, start_code=0, end_code=None):
+        """Yield positions in [start_code, end_code] matching every given filter, in file order"""
+        lists = []
+        for postings_by_value, value in ((self.question_types, question_type), (self.answers, answer)):
+            if value is not None:
+                lists.append(postings_by_value.get(value, array('Q')))
+        if not lists:
+            return
+        # Walk the shortest list and probe the others
+        lists.sort(key=len)
+        walk, others = lists[0], lists[1:]
+        for i in range(bisect_left(walk, start_code), len(walk)):
+            code = walk[i]
+            if end_code is not None and code > end_code:
+                return
+            if all(_contains(postings, code) for postings in others):
+                yield code
+
+    def save(self):
+        """Write the arrays to the sidecar file with an empty change log"""
+        index_path = self.filepath + POSTING_INDEX_SUFFIX
+        lists = [('question_type', value, postings) for value, postings in self.question_types.items()]
+        lists += [('answer', value, postings) for value, postings in self.answers.items()]
+        directory = (json.dumps([[kind, value, len(postings)] for kind, value, postings in lists]) + '\n').encode('utf-8')
+        self.log_offset = HEADER_BYTES + len(directory) + sum(len(postings) for _, _, postings in lists) * 8
+        self.log_bytes = 0
+        tmp_path = f'{index_path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as file:
+                file.write(encode_header(self.size, self.mtime_ns, self.generation, self.log_offset, 0))
+                file.write(directory)
+                for _, _, postings in lists:
+                    postings.tofile(file)
+            os.replace(tmp_path, index_path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        self.pending = []
+
+
+def _contains(postings, code):
+    i = bisect_left(postings, code)
+    return i < len(postings) and postings[i] == code
+
+
+def encode_header(size, mtime_ns, generation, log_offset, log_bytes):
+    header = json_codec.dumps({
+        'format': POSTING_INDEX_FORMAT,
+        'size': size,
+        'mtime_ns': mtime_ns,
+        'generation': generation,
+        'log_offset': log_offset,
+        'log_bytes': log_bytes,
+    })
+    return header.ljust(HEADER_BYTES - 1).encode('utf-8') + b'\n'
+
+
+def build_posting_index(filepath):
+    """Decode the file once and collect the position of every question"""
+    stat = os.stat(filepath)
+    question_types = {}
+    answers = {}
+    with open(filepath, 'r', encoding='utf-8') as file:
+        for line_num, line in enumerate(file, 1):
+            line = line.strip()
+            if not line:
+                continue
+            position = 0
+            for questions in json_codec.loads(line).values():
+                for question in questions:
+                    code = encode_position(line_num, position)
+                    question_types.setdefault(question.get('question_type', 'Unknown'), array('Q')).append(code)
+                    answers.setdefault(question.get('answer', 'Unknown'), array('Q')).append(code)
+                    position += 1
+    return PostingIndex(filepath, question_types, answers, stat.st_size, stat.st_mtime_ns, time.time_ns())
+
+
+def read_posting_index_header(filepath):
+    try:
+        with open(filepath + POSTING_INDEX_SUFFIX, 'rb') as file:
+            header = json_codec.loads(file.read(HEADER_BYTES))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(header, dict) or header.get('format') != POSTING_INDEX_FORMAT:
+        return None
+    return header
+
+
+def _read_log(filepath, offset, length):
+    """Return the [position, answer] records in length bytes of change log at offset"""
+    with open(filepath + POSTING_INDEX_SUFFIX, 'rb') as file:
+        file.seek(offset)
+        data = file.read(length)
+    return [json_codec.loads(line) for line in data.splitlines() if line]
+
+
+def load_posting_index(filepath):
+    """Load the sidecar index if it is still valid, otherwise rebuild it"""
+    stat = os.stat(filepath)
+    header = read_posting_index_header(filepath)
+    if header is not None and header.get('size') == stat.st_size and header.get('mtime_ns') == stat.st_mtime_ns:
+        try:
+            with open(filepath + POSTING_INDEX_SUFFIX, 'rb') as file:
+                file.seek(HEADER_BYTES)
+                directory = json.loads(file.readline())
+                question_types, answers = {}, {}
+                for kind, value, count in directory:
+                    postings = array('Q')
+                    postings.fromfile(file, count)
+                    (question_types if kind == 'question_type' else answers)[value] = postings
+            index = PostingIndex(filepath, question_types, answers, stat.st_size, stat.st_mtime_ns,
+                                 header['generation'], header['log_offset'], header['log_bytes'])
+            for code, answer in _read_log(filepath, header['log_offset'], header['log_bytes']):
+                index.set_answer(code, answer, record=False)
+            return index
+        except (OSError, ValueError, KeyError, EOFError):
+            pass
+
+    index = build_posting_index(filepath)
+    index.save()
+    return index
+
+
+# Indexes already loaded by this process, keyed by data file path
+_loaded_indexes = {}
+
+
+def get_posting_index(filepath):
+    """Return an index matching the data file as it is on disk.
+
+    Any pending in-memory changes are dropped, since they describe edits
+    the caller is about to replay anyway.
+    """
+    stat = os.stat(filepath)
+    index = _loaded_indexes.get(filepath)
+    if index is not None and (index.pending or not index.matches(stat)):
+        # Another process may have logged answer edits against our build
+        header = read_posting_index_header(filepath)
+        if (not index.pending and header is not None and header.get('generation') == index.generation
+                and header.get('log_offset') == index.log_offset and header.get('log_bytes', 0) >= index.log_bytes
+                and header.get('size') == stat.st_size and header.get('mtime_ns') == stat.st_mtime_ns):
+            try:
+                records = _read_log(filepath, index.log_offset + index.log_bytes, header['log_bytes'] - index.log_bytes)
+            except (OSError, ValueError):
+                index = None
+            else:
+                for code, answer in records:
+                    index.set_answer(code, answer, record=False)
+                index.log_bytes = header['log_bytes']
+                index.size, index.mtime_ns = stat.st_size, stat.st_mtime_ns
+        else:
+            index = None
+    if index is None:
+        index = load_posting_index(filepath)
+        _loaded_indexes[filepath] = index
+    return index
+
+
+def restamp_posting_index(filepath, old_stat, new_stat):
+    """Carry the loaded index over a write that only changed answers.
+
+    Its pending changes are appended to the sidecar's change log, or the
+    whole sidecar is rewritten when the log got too long or the sidecar
+    did not describe old_stat.
+    """
+    index = _loaded_indexes.get(filepath)
+    if index is None or not index.matches(old_stat):
+        return
+    index.size, index.mtime_ns = new_stat.st_size, new_stat.st_mtime_ns
+
+    header = read_posting_index_header(filepath)
+    log = b''.join(json_codec.dumps([code, answer]).encode('utf-8') + b'\n' for code, answer in index.pending)
+    if (header is None or header.get('generation') != index.generation
+            or header.get('size') != old_stat.st_size or header.get('mtime_ns') != old_stat.st_mtime_ns
+            or header.get('log_bytes') != index.log_bytes or index.log_bytes + len(log) > MAX_LOG_BYTES):
+        index.save()
+        return
+    try:
+        with open(filepath + POSTING_INDEX_SUFFIX, 'r+b') as file:
+            file.seek(index.log_offset + index.log_bytes)
+            file.write(log)
+            file.truncate()
+            file.flush()
+            file.seek(0)
+            file.write(encode_header(new_stat.st_size, new_stat.st_mtime_ns, index.generation,
+                                     index.log_offset, index.log_bytes + len(log)))
+    except OSError:
+        return
+    index.log_bytes += len(log)
+    index.pending = []
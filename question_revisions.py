@@ -0,0 +1,84 @@
+import sqlite3
+from contextlib import contextmanager
+
+# Revision number of every question, kept in an SQLite file next to the
+# dataset (questions_converted.jsonl.revisions).
+#
+# Every accepted answer edit bumps the revision of its question by one, and
+# a question that was never edited is at revision 0, so only edited
+# questions have a row. Clients send back the revision they read with
+# their edit; an edit made against an older revision is refused instead of
+# silently overwriting the newer answer. The check and the bump share one
+# short SQLite write transaction, which also serializes them between
+# worker processes.
+REVISIONS_SUFFIX = '.revisions'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS revisions (
+    line_number INTEGER NOT NULL,
+    video_key TEXT NOT NULL,
+    data_id INTEGER,
+    revision INTEGER NOT NULL,
+    PRIMARY KEY (line_number, video_key, data_id)
+) WITHOUT ROWID;
+'''
+
+
+class RevisionConflict(Exception):
+    """Raised when edits were made against an older revision of their questions.
+
+    conflicts lists the current state of every such question as
+    {line_number, video_key, data_id, answer, revision}.
+    """
+
+    def __init__(self, conflicts):
+        super().__init__(f'{len(conflicts)} question(s) changed since they were read')
+        self.conflicts = conflicts
+
+
+def connect(db_path):
+    # Stores share one connection between request threads behind their own lock
+    connection = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.executescript(SCHEMA)
+    return connection
+
+
+@contextmanager
+def transaction(connection):
+    """Hold the write lock of the revisions file until the block ends, rolling back on errors"""
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        yield connection
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+    connection.execute('COMMIT')
+
+
+def read_revisions(connection, start_line, end_line):
+    """Return {(line_number, video_key, data_id): revision} of the edited questions in a line range"""
+    return {
+        (line_number, video_key, data_id): revision
+        for line_number, video_key, data_id, revision in connection.execute(
+            'SELECT line_number, video_key, data_id, revision FROM revisions WHERE line_number BETWEEN ? AND ?',
+            (start_line, end_line))
+    }
+
+
+def key_revisions(connection, keys):
+    """Return the revision of every (line_number, video_key, data_id) in keys"""
+    revisions = {}
+    for key in keys:
+        row = connection.execute(
+            'SELECT revision FROM revisions WHERE line_number = ? AND video_key = ? AND data_id IS ?', key).fetchone()
+        revisions[key] = row[0] if row else 0
+    return revisions
+
+
+def set_revisions(connection, revisions):
+    """Store {(line_number, video_key, data_id): revision}"""
+    connection.executemany(
+        'INSERT OR REPLACE INTO revisions (line_number, video_key, data_id, revision) VALUES (?, ?, ?, ?)',
+        [(*key, revision) for key, revision in revisions.items()])
@@ -0,0 +1,53 @@
+from collections import Counter
+
+
+class QuestionStatistics:
+    """Counts over every question of the dataset, kept up to date incrementally"""
+
+    def __init__(self):
+        self.total = 0
+        self.question_type_counts = Counter()
+        self.answer_counts = Counter()
+
+    def add_line(self, line):
+        """Count every question of one CompactLine"""
+        for question_type, answer in line.categories():
+            self.total += 1
+            self.question_type_counts[question_type] += 1
+            self.answer_counts[answer] += 1
+
+    def remove_line(self, line):
+        """Stop counting the questions of one CompactLine"""
+        for question_type, answer in line.categories():
+            self.total -= 1
+            self.question_type_counts[question_type] -= 1
+            self.answer_counts[answer] -= 1
+
+    def add_questions(self, questions):
+        """Count flattened question dicts, as returned by QuestionStore.questions()"""
+        for question in questions:
+            self.total += 1
+            self.question_type_counts[question.get('question_type', 'Unknown')] += 1
+            self.answer_counts[question.get('answer', 'Unknown')] += 1
+
+    def update(self, other):
+        """Add the counts of another QuestionStatistics"""
+        self.total += other.total
+        self.question_type_counts.update(other.question_type_counts)
+        self.answer_counts.update(other.answer_counts)
+
+    def change_answer(self, old_answer, new_answer):
+        """Move one question from old_answer to new_answer"""
+        self.answer_counts[old_answer] -= 1
+        self.answer_counts[new_answer] += 1
+
+    def distributions(self):
+        """Return a snapshot of every distribution shown on the statistics page"""
+        return {
+            # Every question is a sport video and multiple choice at the moment
+            'video_type': {'sport': self.total} if self.total else {},
+            'hierarchy': {'multiple_choice': self.total} if self.total else {},
+            'question_type': {question_type: count for question_type, count in self.question_type_counts.items() if count},
+            'wrong_choice_design': {'multiple_choice': self.total} if self.total else {},
+            'answer': {answer: count for answer, count in sorted(self.answer_counts.items()) if count},
+        }
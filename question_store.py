@@ -0,0 +1,668 @@
+import hashlib
+import itertools
+import os
+import threading
+import time
+
+import json_codec
+import question_revisions
+import search_index
+from answer_journal import AnswerJournal
+from compact_lines import CompactLine
+from key_index import get_key_index, restamp_key_index
+from line_index import build_line_index, get_line_index
+from posting_index import POSITION_BITS, decode_position, encode_position, get_posting_index, restamp_posting_index
+from question_revisions import RevisionConflict
+from question_statistics import QuestionStatistics
+from request_metrics import count, phase
+from safe_io import atomic_write, dataset_lock
+
+VALID_ANSWERS = ['A', 'B', 'C', 'D']
+
+
+def file_signature(stat):
+    return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+
+class QuestionStore:
+    """Parsed contents of one JSONL file, shared by every route of the process.
+
+    Lines are decoded on first use and kept in memory as CompactLines, which
+    hold the raw bytes and decode question text again only when a caller
+    asks for question dicts. `version` increases
+    every time the data changes, either because the file was modified on
+    disk or because update_answer() wrote to it.
+
+    Pending edits in the answer journal are overlaid on the base file. In
+    journal mode update_answer() only appends to the journal and a background
+    compactor folds it into the data file.
+
+    In write-behind mode edits are acknowledged once they are applied in
+    memory and a background flusher writes them out, coalesced, at most once
+    per flush interval. Other workers see them after that flush.
+
+    Every question has a revision in the .revisions sidecar that reads
+    return and every accepted edit bumps; an edit that names the revision
+    it was made against is refused with RevisionConflict once the question
+    has moved on.
+
+    Several worker processes may share one data file: reads hold the
+    dataset lock shared, writes hold it exclusive and replace files
+    atomically, and every worker notices the others' writes through the
+    file and journal signatures.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.version = 0
+        self.journal = AnswerJournal(filepath)
+        self.journal_mode = False
+        self._lock = threading.RLock()
+        self._signature = None
+        self._index = None
+        self._keys = None  # KeyIndex, loaded the first time a question is looked up by key
+        self._postings = None  # PostingIndex, loaded the first time questions are filtered
+        self._lines = {}  # line number -> CompactLine, None for blank lines
+        self._overlay = {}  # line number -> {(video_key, data_id): answer} from the journal
+        self._journal_started = None
+        self._journal_offset = 0  # bytes of the journal already in _overlay
+        self._statistics = None  # QuestionStatistics over every line, built on first use
+        self._search = None  # connection to the search index, opened on first search
+        self._revisions = None  # connection to the revisions sidecar, opened on first edit
+        self._compactor = None
+        self.write_behind = False
+        self._unflushed = {}  # line number -> {(video_key, data_id): answer} acknowledged but not written yet
+        self._unflushed_revisions = {}  # (line number, video_key, data_id) -> revision of the queued answer
+        self._unflushed_edits = 0
+        self._unflushed_since = None
+        self._flush_requested = threading.Event()
+        self._flush_interval = None
+        self._flusher = None
+        self._last_flush = None
+        self._last_flush_seconds = None
+        self._flush_errors = 0
+
+    def _current_signature(self):
+        return (file_signature(os.stat(self.filepath)), self.journal.stat_signature())
+
+    def _refresh(self):
+        """Pick up changes made behind our back by another worker or tool"""
+        signature = self._current_signature()
+        if signature == self._signature:
+            return
+
+        data_signature, journal_signature = signature
+        if (self._signature is not None and data_signature == self._signature[0]
+                and journal_signature is not None and journal_signature[0] >= self._journal_offset):
+            # Only the journal grew: apply the new edits to what is already decoded
+            self._read_journal(self._journal_offset)
+        else:
+            self._index = get_line_index(self.filepath)
+            self._keys = None
+            self._postings = None
+            self._lines = {}
+            self._statistics = None
+            self._overlay = {}
+            self._journal_started = None
+            self._read_journal(0)
+        self._signature = signature
+        self.version += 1
+
+    def _read_journal(self, offset):
+        entries, self._journal_offset = self.journal.read_entries(offset)
+        for entry in entries:
+            if self._journal_started is None:
+                self._journal_started = entry.get('time', time.time())
+            line_number = entry['line_number']
+            answers = {(entry['video_key'], entry['data_id']): entry['answer']}
+            self._overlay.setdefault(line_number, {}).update(answers)
+            if self._lines.get(line_number) is not None:
+                self._patch_cached_line(line_number, answers)
+                # Our own queued edits are newer than anything already journaled
+                if line_number in self._unflushed:
+                    self._patch_cached_line(line_number, self._unflushed[line_number])
+            if self._postings is not None:
+                self._decode_range(line_number, line_number)
+                self._sync_postings(line_number, self._lines.get(line_number))
+
+    def _posting_index(self):
+        if self._postings is None:
+            self._postings = get_posting_index(self.filepath)
+            # The sidecar describes the data file; journaled and queued edits go on top
+            for line_number in {**self._overlay, **self._unflushed}:
+                self._decode_range(line_number, line_number)
+                self._sync_postings(line_number, self._lines.get(line_number))
+        return self._postings
+
+    def _sync_postings(self, line_number, line):
+        """Move every question of a cached line to the posting list of its current answer"""
+        if self._postings is None or line is None:
+            return
+        for position, answer in enumerate(line.iter_answers()):
+            self._postings.set_answer(encode_position(line_number, position), answer)
+
+    def _key_index(self):
+        if self._keys is None:
+            self._keys = get_key_index(self.filepath)
+        return self._keys
+
+    def _find_position(self, line_number, video_key, data_id):
+        """Position of a question within its cached line, located through the key index, or None"""
+        line = self._lines.get(line_number)
+        video_position = self._key_index().position(line_number, video_key, data_id)
+        if line is None or video_position is None:
+            return None
+        return line.position(video_key, video_position)
+
+    def _find_question(self, line_number, line_data, video_key, data_id):
+        """Return the question dict of a decoded line, or None.
+
+        Goes straight to its position when the key index is loaded.
+        """
+        questions = line_data.get(video_key, [])
+        if self._keys is not None:
+            position = self._keys.position(line_number, video_key, data_id)
+            return questions[position] if position is not None and position < len(questions) else None
+        return next((question for question in questions if question['data_id'] == data_id), None)
+
+    def _apply_answers(self, line_number, line_data, answers):
+        """Apply {(video_key, data_id): answer} to a decoded line in place,
+        returning the (old, new) answer of every question touched"""
+        changes = []
+        for (video_key, data_id), answer in answers.items():
+            question = self._find_question(line_number, line_data, video_key, data_id)
+            if question is not None:
+                changes.append((question.get('answer', 'Unknown'), answer))
+                question['answer'] = answer
+        return changes
+
+    def _patch_cached_line(self, line_number, answers):
+        """Apply answers to a cached line and keep the statistics in step"""
+        changes = self._lines[line_number].apply_answers(answers)
+        if self._statistics is not None:
+            for old_answer, new_answer in changes:
+                self._statistics.change_answer(old_answer, new_answer)
+
+    def _decode_range(self, start_line, end_line):
+        """Make sure lines start_line..end_line are decoded"""
+        start_line = max(start_line, 1)
+        end_line = min(end_line, self._index.line_count)
+        missing = [n for n in range(start_line, end_line + 1) if n not in self._lines]
+        count('scalelong_cache_hits_total', max(end_line - start_line + 1 - len(missing), 0), cache='decoded_lines')
+        count('scalelong_cache_misses_total', len(missing), cache='decoded_lines')
+        if not missing:
+            return
+        with phase('decode'):
+            for line_num in missing:
+                line = self._index.line_bytes(line_num).strip()
+                data = CompactLine(line) if line else None
+                if data is not None and line_num in self._overlay:
+                    data.apply_answers(self._overlay[line_num])
+                if data is not None and line_num in self._unflushed:
+                    data.apply_answers(self._unflushed[line_num])
+                self._lines[line_num] = data
+
+    def current_version(self):
+        """Return the data version after picking up any change on disk"""
+        with self._lock, dataset_lock(self.filepath, exclusive=False):
+            self._refresh()
+            return self.version
+
+    def data_tag(self):
+        """Short identifier of the current data, identical in every worker process.
+
+        `version` is a per-process counter, so cache validators use this
+        digest of the data file and journal signatures instead. Edits queued
+        in write-behind mode only exist in this process until they are
+        flushed, so they make the tag process-specific meanwhile.
+        """
+        with self._lock, dataset_lock(self.filepath, exclusive=False):
+            self._refresh()
+            state = (self._signature, os.getpid(), self.version) if self._unflushed else self._signature
+            return hashlib.sha1(repr(state).encode('utf-8')).hexdigest()[:16]
+
+    def line_count(self):
+        with self._lock, dataset_lock(self.filepath, exclusive=False):
+            self._refresh()
+            return self._index.line_count
+
+    def questions(self, start_line=None, end_line=None):
+        """Return flattened questions, optionally limited to a line range"""
+        with self._lock, dataset_lock(self.filepath, exclusive=False):
+            self._refresh()
+            if start_line is None or end_line is None:
+                start_line, end_line = 1, self._index.line_count
+            self._decode_range(start_line, end_line)
+
+            questions_with_lines = []
+            with phase('range_filter'):
+                for line_num in range(max(start_line, 1), min(end_line, self._index.line_count) + 1):
+                    if self._lines[line_num] is not None:
+                        questions_with_lines.extend(
+                            self._lines[line_num].questions(line_num, self._index.line_bytes(line_num)))
+            return self._add_revisions(questions_with_lines)
+
+    def video_lines(self, video_key):
+        """Return the line numbers holding video_key, in file order"""
+        with self._lock, dataset_lock(self.filepath, exclusive=False):
+            self._refresh()
+            return self._key_index().video_lines(video_key)
+
+    def _search_connection(self):
+        if self._search is None:
+            self._search = search_index.connect(self.filepath + search_index.SEARCH_INDEX_SUFFIX)
+        return self._search
+
+    def _revision_connection(self, create=True):
+        if self._revisions is None:
+            db_path = self.filepath + question_revisions.REVISIONS_SUFFIX
+            if not create and not os.path.exists(db_path):
+                return None
+            self._revisions = question_revisions.connect(db_path)
+        return self._revisions
+
+    def _add_revisions(self, questions):
+        """Set 'revision' on question dicts in file order, 0 for questions never edited"""
+        connection = self._revision_connection(create=False)
+        revisions = {}
+        if connection is not None and questions:
+            revisions = question_revisions.read_revisions(
+                connection, questions[0]['line_number'], questions[-1]['line_number'])
+        for question in questions:
+            question['revision'] = revisions.get(
+                (question['line_number'], question['video_key'], question.get('data_id')), 0)
+        return questions
+
+    def _scan_lines(self):
+        """Yield (line_number, raw bytes) over the whole data file"""
+        return self._index.read_lines(1, self._index.line_count)
+
+    def search(self, query, question_type=None):
+        """Return [(score, line_number, video_key, data_id)] matching query, best first.
+
+        The search index is brought up to date with the data file first;
+        only lines that changed since it was last updated are re-tokenized.
+        """
+        with self._lock, dataset_lock(self.filepath, exclusive=False):
+            self._refresh()
+            connection = self._search_connection()
+            search_index.update_search_index(connection, repr(self._signature[0]), self._scan_lines)
+            return search_index.search(connection, query, question_type)
+
+    def filter_questions(self, question_type=None, answer=None, cursor_line=1, cursor_position=0,
+                         end_line=None, limit=50):
+        """Return (questions, next_cursor) for up to limit questions matching every given filter.
+
+        Questions are taken in file order from question cursor_position of
+        line cursor_line on, through the posting lists, so only matching
+        lines are decoded. next_cursor is "line:position" or None.
+        """
+        with self._lock, dataset_lock(self.filepath, exclusive=False):
+            self._refresh()
+            end_code = None if end_line is None else encode_position(end_line, (1 << POSITION_BITS) - 1)
+            codes = list(itertools.islice(self._posting_index().iter_matches(
+                question_type, answer, encode_position(max(cursor_line, 1), cursor_position), end_code), limit + 1))
+
+            questions = []
+            flattened = {}
+            for code in codes[:limit]:
+                line_number, position = decode_position(code)
+                if line_number not in flattened:
+                    self._decode_range(line_number, line_number)
+                    line = self._lines.get(line_number)
+                    flattened[line_number] = (
+                        line.questions(line_number, self._index.line_bytes(line_number)) if line is not None else [])
+                if position < len(flattened[line_number]):
+                    questions.append(flattened[line_number][position])
+            next_cursor = '{}:{}'.format(*decode_position(codes[limit])) if len(codes) > limit else None
+            return self._add_revisions(questions), next_cursor
+
+    def statistics(self):
+        """Return (version, distributions) over the whole dataset.
+
+        The counts are built once per load of the file and then adjusted
+        in place by every answer edit.
+        """
+        with self._lock, dataset_lock(self.filepath, exclusive=False):
+            self._refresh()
+            if self._statistics is None:
+                self._decode_range(1, self._index.line_count)
+                statistics = QuestionStatistics()
+                for line_num in range(1, self._index.line_count + 1):
+                    if self._lines[line_num] is not None:
+                        statistics.add_line(self._lines[line_num])
+                self._statistics = statistics
+            return self.version, self._statistics.distributions()
+
+    def update_answer(self, line_number, video_key, data_id, new_answer_choice, revision=None):
+        """Set the answer of one question and patch the cache.
+
+        With a revision the edit only goes through while the question is
+        still at that revision, otherwise RevisionConflict is raised.
+        """
+        with self._lock, dataset_lock(self.filepath, exclusive=not self.write_behind):
+            self._refresh()
+            if not 1 <= line_number <= self._index.line_count:
+                return False
+            self._decode_range(line_number, line_number)
+
+            line = self._lines[line_number]
+            if line is None:
+                return False
+            if new_answer_choice in VALID_ANSWERS and self._find_position(line_number, video_key, data_id) is not None:
+                self._write_edits([(line_number, video_key, data_id, new_answer_choice)],
+                                  None if revision is None else [revision])
+            return True
+
+    def update_answers(self, edits, revisions=None):
+        """Validate a batch of (line_number, video_key, data_id, answer) edits
+        together and apply them with a single write. Returns a list of error
+        messages; nothing is written unless the list is empty.
+
+        revisions optionally lists the revision every edit was made
+        against (None for an unconditional edit); if any question moved on,
+        RevisionConflict is raised and nothing is written.
+        """
+        with self._lock, dataset_lock(self.filepath, exclusive=not self.write_behind):
+            self._refresh()
+            errors = []
+            for i, (line_number, video_key, data_id, answer) in enumerate(edits):
+                if answer not in VALID_ANSWERS:
+                    errors.append(f"Edit {i}: invalid answer {answer!r}")
+                    continue
+                if not isinstance(line_number, int) or not 1 <= line_number <= self._index.line_count:
+                    errors.append(f"Edit {i}: line {line_number} out of range")
+                    continue
+                self._decode_range(line_number, line_number)
+                if self._find_position(line_number, video_key, data_id) is None:
+                    errors.append(f"Edit {i}: question {video_key}/{data_id} not found on line {line_number}")
+            if errors or not edits:
+                return errors
+            self._write_edits(edits, revisions)
+            return []
+
+    def _write_edits(self, edits, revisions=None):
+        """Check the revisions of validated edits, write the edits and bump their revisions.
+
+        The revisions file stays locked from the check to the bump, so of
+        two edits made against the same revision, in any worker, only the
+        first goes through.
+        """
+        keys = list(dict.fromkeys((line_number, video_key, data_id) for line_number, video_key, data_id, _ in edits))
+        with question_revisions.transaction(self._revision_connection()) as connection:
+            current = question_revisions.key_revisions(connection, keys)
+            stale = []
+            for (line_number, video_key, data_id, _), revision in zip(edits, revisions or ()):
+                key = (line_number, video_key, data_id)
+                if revision is not None and revision != current[key] and key not in stale:
+                    stale.append(key)
+            if stale:
+                raise RevisionConflict([self._question_state(key, current[key]) for key in stale])
+
+            bumped = {key: current[key] + 1 for key in keys}
+            if self.write_behind:
+                self._queue_answers(edits, bumped)
+            elif self.journal_mode:
+                self._journal_answers(edits)
+            else:
+                answers_by_line = {}
+                for line_number, video_key, data_id, answer in edits:
+                    answers_by_line.setdefault(line_number, {})[(video_key, data_id)] = answer
+                self._rewrite_lines({
+                    line_number: self._lines[line_number].decode(self._index.line_bytes(line_number), answers)
+                    for line_number, answers in answers_by_line.items()
+                })
+            question_revisions.set_revisions(connection, bumped)
+
+    def _question_state(self, key, revision):
+        """The current answer and revision of a question, as reported in a conflict"""
+        line_number, video_key, data_id = key
+        line = self._lines[line_number]
+        return {
+            'line_number': line_number,
+            'video_key': video_key,
+            'data_id': data_id,
+            'answer': line.answer(self._find_position(line_number, video_key, data_id)),
+            'revision': revision,
+        }
+
+    def _rewrite_lines(self, changed_lines):
+        """Replace whole lines, given as JSON objects, in the data file with one read-modify-write"""
+        # A direct rewrite must not be overridden later by an older journal entry
+        if self._overlay:
+            self._compact_locked()
+
+        new_lines = {
+            line_number: (json_codec.dumps(line_data) + '\n').encode('utf-8')
+            for line_number, line_data in changed_lines.items()
+        }
+        new_cached = {line_number: CompactLine(raw.rstrip(b'\n')) for line_number, raw in new_lines.items()}
+        # Logged to the posting sidecar as part of the write
+        self._posting_index()
+        for line_number, line in new_cached.items():
+            self._sync_postings(line_number, line)
+        with phase('file_write'):
+            with open(self.filepath, 'rb') as file:
+                content = file.read()
+            pieces = []
+            position = 0
+            for line_number in sorted(new_lines):
+                pieces.append(content[position:self._index.offsets[line_number - 1]])
+                pieces.append(new_lines[line_number])
+                position = self._index.offsets[line_number]
+            pieces.append(content[position:])
+            count('scalelong_bytes_written_total', self._write_data_file(pieces), file='data')
+
+        stat = os.stat(self.filepath)
+        for line_number in sorted(new_lines):
+            self._index.replace_line(line_number, len(new_lines[line_number]), stat)
+        self._index.save()
+        if self._statistics is not None:
+            for line_number, line in new_cached.items():
+                self._statistics.remove_line(self._lines[line_number])
+                self._statistics.add_line(line)
+        self._lines.update(new_cached)
+        self._signature = self._current_signature()
+        self.version += 1
+
+    def _write_data_file(self, chunks):
+        """Atomically replace the data file with a version that only differs in answers"""
+        old_stat = os.stat(self.filepath)
+        try:
+            written = atomic_write(self.filepath, chunks)
+        except BaseException:
+            # The posting lists may already hold the new answers; reload them from disk
+            self._postings = None
+            raise
+        new_stat = os.stat(self.filepath)
+        restamp_key_index(self.filepath, old_stat, new_stat)
+        restamp_posting_index(self.filepath, old_stat, new_stat)
+        if self._search is not None or os.path.exists(self.filepath + search_index.SEARCH_INDEX_SUFFIX):
+            search_index.restamp_search_index(
+                self._search_connection(), repr(file_signature(old_stat)), repr(file_signature(new_stat)))
+        return written
+
+    def _journal_answers(self, edits):
+        """Record edits in the journal instead of rewriting the data file"""
+        with phase('file_write'):
+            count('scalelong_bytes_written_total', self.journal.append_many(edits), file='journal')
+        self._journal_offset = self.journal.size()
+        if self._journal_started is None:
+            self._journal_started = time.time()
+        for line_number, video_key, data_id, answer in edits:
+            answers = {(video_key, data_id): answer}
+            self._overlay.setdefault(line_number, {}).update(answers)
+            self._patch_cached_line(line_number, answers)
+            self._sync_postings(line_number, self._lines[line_number])
+        self._signature = self._current_signature()
+        self.version += 1
+
+    def _queue_answers(self, edits, revisions):
+        """Apply edits in memory and leave writing them to the flusher thread.
+
+        revisions maps (line_number, video_key, data_id) to the revision
+        each edit was given.
+        """
+        self._unflushed_revisions.update(revisions)
+        for line_number, video_key, data_id, answer in edits:
+            queued = self._unflushed.setdefault(line_number, {})
+            queued_before = len(queued)
+            queued[(video_key, data_id)] = answer
+            self._unflushed_edits += len(queued) - queued_before
+            self._patch_cached_line(line_number, {(video_key, data_id): answer})
+            self._sync_postings(line_number, self._lines[line_number])
+        if self._unflushed_since is None:
+            self._unflushed_since = time.time()
+        self.version += 1
+        self._flush_requested.set()
+
+    def flush(self):
+        """Write every queued edit to the journal, or to the data file outside journal mode"""
+        with self._lock, dataset_lock(self.filepath, exclusive=True):
+            self._refresh()
+            if not self._unflushed:
+                return
+            start = time.perf_counter()
+            self._drop_superseded()
+            for line_number in self._unflushed:
+                self._decode_range(line_number, line_number)
+            # Lines that another tool removed in the meantime are dropped
+            lines = [line_number for line_number in sorted(self._unflushed) if self._lines.get(line_number) is not None]
+            if lines and self.journal_mode:
+                self._journal_answers([
+                    (line_number, video_key, data_id, answer)
+                    for line_number in lines
+                    for (video_key, data_id), answer in self._unflushed[line_number].items()
+                ])
+            elif lines:
+                self._rewrite_lines({
+                    line_number: self._lines[line_number].decode(self._index.line_bytes(line_number))
+                    for line_number in lines
+                })
+            self._unflushed = {}
+            self._unflushed_revisions = {}
+            self._unflushed_edits = 0
+            self._unflushed_since = None
+            self._last_flush = time.time()
+            self._last_flush_seconds = time.perf_counter() - start
+
+    def _drop_superseded(self):
+        """Forget queued answers that another worker replaced with a newer revision since.
+
+        That worker writes its own answer, so flushing ours too could put
+        the older answer back on disk when our flush happens to run later.
+        """
+        current = question_revisions.key_revisions(self._revision_connection(), list(self._unflushed_revisions))
+        superseded = [key for key, revision in self._unflushed_revisions.items() if current[key] > revision]
+        if not superseded:
+            return
+        for line_number, video_key, data_id in superseded:
+            del self._unflushed_revisions[(line_number, video_key, data_id)]
+            queued = self._unflushed[line_number]
+            del queued[(video_key, data_id)]
+            if not queued:
+                del self._unflushed[line_number]
+        self._unflushed_edits -= len(superseded)
+        # Decode everything again from disk, with what is left of the queue on top
+        self._signature = None
+        self._refresh()
+
+    def write_behind_status(self):
+        """Return how far the data on disk lags behind acknowledged edits.
+
+        Reads counters without taking the store lock, so it answers even
+        while a flush is running.
+        """
+        unflushed_since = self._unflushed_since
+        return {
+            'write_behind': self.write_behind,
+            'flush_interval_ms': None if self._flush_interval is None else self._flush_interval * 1000,
+            'unflushed_edits': self._unflushed_edits,
+            'flush_lag_ms': round((time.time() - unflushed_since) * 1000, 1) if unflushed_since else 0.0,
+            'last_flush': self._last_flush,
+            'last_flush_ms': None if self._last_flush_seconds is None else round(self._last_flush_seconds * 1000, 1),
+            'flush_errors': self._flush_errors,
+        }
+
+    def compact(self):
+        """Fold the journal into a new data file"""
+        with self._lock, dataset_lock(self.filepath, exclusive=True):
+            self._refresh()
+            if self._overlay:
+                self._compact_locked()
+
+    def _compact_locked(self):
+        # The journal's answers reach the posting sidecar through its change log
+        self._posting_index()
+
+        def compacted_lines():
+            for line_num, line in self._index.read_lines(1, self._index.line_count):
+                if line_num in self._overlay and line.strip():
+                    line_data = json_codec.loads(line.strip())
+                    self._apply_answers(line_num, line_data, self._overlay[line_num])
+                    line = (json_codec.dumps(line_data) + '\n').encode('utf-8')
+                yield line
+
+        with phase('file_write'):
+            count('scalelong_bytes_written_total', self._write_data_file(compacted_lines()), file='data')
+        self.journal.clear()
+        self._journal_offset = 0
+
+        # Decoded lines already carry the overlay, so only the offsets need rebuilding
+        self._index = build_line_index(self.filepath)
+        self._index.save()
+        self._overlay = {}
+        self._journal_started = None
+        self._signature = self._current_signature()
+
+    def enable_journal(self, max_bytes, max_age, check_interval=1.0):
+        """Switch to journal mode and start the background compactor"""
+        with self._lock:
+            self.journal_mode = True
+            if self._compactor is not None:
+                return
+            self._compactor = threading.Thread(
+                target=self._compactor_loop,
+                args=(max_bytes, max_age, check_interval),
+                daemon=True,
+            )
+            self._compactor.start()
+
+    def enable_write_behind(self, flush_interval):
+        """Switch to write-behind mode and start the background flusher"""
+        with self._lock:
+            self.write_behind = True
+            self._flush_interval = flush_interval
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flusher_loop, args=(flush_interval,), daemon=True)
+            self._flusher.start()
+
+    def _flusher_loop(self, flush_interval):
+        while True:
+            self._flush_requested.wait()
+            # Edits acknowledged while we wait share this flush
+            time.sleep(flush_interval)
+            self._flush_requested.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                self._flush_errors += 1
+                print(f"Error flushing queued answers: {e}")
+                self._flush_requested.set()
+
+    def _compactor_loop(self, max_bytes, max_age, check_interval):
+        while True:
+            time.sleep(check_interval)
+            try:
+                with self._lock, dataset_lock(self.filepath, exclusive=True):
+                    self._refresh()
+                    if not self._overlay:
+                        continue
+                    too_big = self.journal.size() >= max_bytes
+                    too_old = time.time() - self._journal_started >= max_age
+                    if too_big or too_old:
+                        self._compact_locked()
+            except Exception as e:
+                print(f"Error compacting answer journal: {e}")
+
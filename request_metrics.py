@@ -0,0 +1,167 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# In-process request metrics, exposed in Prometheus text format by /metrics.
+#
+# Routes are timed as a whole, and the hot code paths time themselves with
+#   with phase('decode'): ...
+# The phases are decode, range_filter, html_render, file_write, chart_render
+# and chart_encode.
+# Phase durations go into a histogram and, during a request, into that
+# request's breakdown, which the slow-request log prints.
+#
+# Every worker process keeps its own numbers; samples carry a worker="<pid>"
+# label so a scraper can tell processes apart.
+#
+# SCALELONG_SLOW_REQUEST_MS=<ms> logs every request slower than that, as one
+# JSON line on stderr or appended to SCALELONG_SLOW_REQUEST_LOG if set.
+
+LATENCY_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+SLOW_REQUEST_MS = float(os.environ['SCALELONG_SLOW_REQUEST_MS']) if os.environ.get('SCALELONG_SLOW_REQUEST_MS') else None
+SLOW_REQUEST_LOG = os.environ.get('SCALELONG_SLOW_REQUEST_LOG')
+
+_lock = threading.Lock()
+_current = threading.local()
+
+# name -> (type, help text); samples are keyed by (name, sorted label items)
+METRICS = {
+    'scalelong_request_duration_seconds': ('histogram', 'Time from request start to the last byte of the response'),
+    'scalelong_phase_duration_seconds': ('histogram', 'Time spent in one instrumented phase'),
+    'scalelong_requests_total': ('counter', 'Requests served'),
+    'scalelong_edits_total': ('counter', 'Answer edits applied'),
+    'scalelong_revision_conflicts_total': ('counter', 'Edits refused because their question changed since it was read'),
+    'scalelong_cache_hits_total': ('counter', 'Lookups answered from a cache'),
+    'scalelong_cache_misses_total': ('counter', 'Lookups that had to compute their result'),
+    'scalelong_bytes_written_total': ('counter', 'Bytes written to data and journal files'),
+}
+_counters = {}
+_histograms = {}  # key -> [bucket counts..., sum, count]
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def count(name, amount=1, **labels):
+    """Add amount to a counter"""
+    with _lock:
+        key = _key(name, labels)
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, seconds, **labels):
+    """Record one duration in a histogram"""
+    with _lock:
+        key = _key(name, labels)
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                histogram[i] += 1
+        histogram[-2] += seconds
+        histogram[-1] += 1
+
+
+@contextmanager
+def phase(name):
+    """Time a block of work as one phase of the current request"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe('scalelong_phase_duration_seconds', elapsed, phase=name)
+        timing = getattr(_current, 'timing', None)
+        if timing is not None:
+            timing['phases'][name] = timing['phases'].get(name, 0.0) + elapsed
+
+
+def begin_request():
+    """Start timing a request on this thread and return its timing record"""
+    _current.timing = {'start': time.perf_counter(), 'phases': {}}
+    return _current.timing
+
+
+def current_timing():
+    """Timing record of the request running on this thread, or None"""
+    return getattr(_current, 'timing', None)
+
+
+def finish_request(timing, method, route, status):
+    """Record a finished request; called once the response body has been sent"""
+    if current_timing() is timing:
+        _current.timing = None
+    elapsed = time.perf_counter() - timing['start']
+    observe('scalelong_request_duration_seconds', elapsed, route=route)
+    count('scalelong_requests_total', method=method, route=route, status=str(status))
+
+    if SLOW_REQUEST_MS is not None and elapsed * 1000 >= SLOW_REQUEST_MS:
+        phases_ms = {name: round(seconds * 1000, 2) for name, seconds in timing['phases'].items()}
+        entry = json.dumps({
+            'time': time.time(),
+            'worker': os.getpid(),
+            'method': method,
+            'route': route,
+            'status': status,
+            'total_ms': round(elapsed * 1000, 2),
+            # Nested phases (a compaction inside a write) are counted in both
+            'other_ms': round(max(elapsed * 1000 - sum(phases_ms.values()), 0.0), 2),
+            'phases_ms': phases_ms,
+        })
+        if SLOW_REQUEST_LOG:
+            with _lock, open(SLOW_REQUEST_LOG, 'a', encoding='utf-8') as file:
+                file.write(entry + '\n')
+        else:
+            print(f"Slow request: {entry}", file=sys.stderr)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def render_prometheus(gauges=None):
+    """Return every metric in Prometheus text exposition format.
+
+    gauges maps a metric name to (help text, value) for values measured at
+    scrape time, such as the dataset size.
+    """
+    worker = (('worker', str(os.getpid())),)
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: list(value) for key, value in _histograms.items()}
+
+    lines = []
+    for name, (metric_type, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        if metric_type == 'counter':
+            for (sample_name, labels), value in sorted(counters.items()):
+                if sample_name == name:
+                    lines.append(f"{name}{_format_labels(worker + labels)} {value}")
+            continue
+        for (sample_name, labels), histogram in sorted(histograms.items()):
+            if sample_name != name:
+                continue
+            for bound, bucket_count in zip(LATENCY_BUCKETS, histogram):
+                lines.append(f"{name}_bucket{_format_labels(worker + labels + (('le', repr(bound)),))} {bucket_count}")
+            lines.append(f"{name}_bucket{_format_labels(worker + labels + (('le', '+Inf'),))} {histogram[-1]}")
+            lines.append(f"{name}_sum{_format_labels(worker + labels)} {histogram[-2]}")
+            lines.append(f"{name}_count{_format_labels(worker + labels)} {histogram[-1]}")
+
+    for name, (help_text, value) in (gauges or {}).items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name}{_format_labels(worker)} {value}")
+    return '\n'.join(lines) + '\n'
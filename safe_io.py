@@ -0,0 +1,59 @@
+import os
+import stat
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows; only the single-process dev server is supported there
+    fcntl = None
+
+# Advisory lock file next to the data file (questions_converted.jsonl.lock).
+# Every worker process takes it shared for reads and exclusive for writes.
+LOCK_SUFFIX = '.lock'
+
+
+@contextmanager
+def dataset_lock(filepath, exclusive=True):
+    """Hold the cross-process lock of a data file"""
+    if fcntl is None:
+        yield
+        return
+    with open(filepath + LOCK_SUFFIX, 'a') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def atomic_write(filepath, chunks):
+    """Write byte chunks to a temp file next to filepath, then rename it into place.
+
+    Readers see either the old or the new file, never a half-written one.
+    Returns the number of bytes written.
+    """
+    directory = os.path.dirname(os.path.abspath(filepath))
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=os.path.basename(filepath) + '.', suffix='.tmp'
+    )
+    written = 0
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            for chunk in chunks:
+                written += file.write(chunk)
+            file.flush()
+            os.fsync(file.fileno())
+        try:
+            os.chmod(tmp_path, stat.S_IMODE(os.stat(filepath).st_mode))
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return written
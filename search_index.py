@@ -0,0 +1,187 @@
+import math
+import re
+import sqlite3
+import zlib
+
+import json_codec
+
+# Token-level inverted index over the question and option texts, kept in an
+# SQLite file next to the dataset (questions_converted.jsonl.search).
+#
+# The index remembers the signature of the data it was built from and a
+# CRC32 of every line. When the data changes, only lines whose CRC differs
+# are re-tokenized, and a restart with unchanged data does no work at all.
+# Answers are not indexed: they change with every edit, so callers filter
+# on them against the live data.
+SEARCH_INDEX_SUFFIX = '.search'
+TOKEN_PATTERN = re.compile(r'\w+')
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lines (
+    line_number INTEGER PRIMARY KEY,
+    crc INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id INTEGER PRIMARY KEY,
+    line_number INTEGER NOT NULL,
+    video_key TEXT NOT NULL,
+    data_id INTEGER,
+    question_type TEXT,
+    length INTEGER NOT NULL  -- number of tokens in the question and its options
+);
+CREATE INDEX IF NOT EXISTS documents_line_number ON documents (line_number);
+CREATE TABLE IF NOT EXISTS postings (
+    token TEXT NOT NULL,
+    doc_id INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (token, doc_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_doc_id ON postings (doc_id);
+'''
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def question_tokens(question):
+    """Tokens of a question's text and all of its options"""
+    tokens = tokenize(str(question.get('question', '')))
+    for option in (question.get('options') or {}).values():
+        tokens.extend(tokenize(str(option)))
+    return tokens
+
+
+def connect(db_path):
+    # Stores share one connection between request threads behind their own lock
+    connection = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def indexed_signature(connection):
+    row = connection.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+    return row[0] if row else None
+
+
+def set_signature(connection, signature):
+    connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('signature', ?)", (signature,))
+
+
+def _remove_lines(connection, line_numbers):
+    for line_number in line_numbers:
+        connection.execute(
+            'DELETE FROM postings WHERE doc_id IN (SELECT doc_id FROM documents WHERE line_number = ?)', (line_number,))
+        connection.execute('DELETE FROM documents WHERE line_number = ?', (line_number,))
+
+
+def _add_line(connection, line_number, raw):
+    line = raw.strip()
+    if not line:
+        return
+    for video_key, questions in json_codec.loads(line).items():
+        for question in questions:
+            tokens = question_tokens(question)
+            doc_id = connection.execute(
+                'INSERT INTO documents (line_number, video_key, data_id, question_type, length) VALUES (?, ?, ?, ?, ?)',
+                (line_number, video_key, question.get('data_id'), question.get('question_type', 'Unknown'), len(tokens))
+            ).lastrowid
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            connection.executemany(
+                'INSERT INTO postings (token, doc_id, tf) VALUES (?, ?, ?)',
+                [(token, doc_id, tf) for token, tf in counts.items()]
+            )
+
+
+def update_search_index(connection, signature, lines):
+    """Bring the index up to date with the data identified by signature.
+
+    lines is a callable returning an iterable of (line_number, raw bytes)
+    over the whole dataset; it is only called when the signature changed.
+    Returns the number of lines that were (re)indexed.
+    """
+    if indexed_signature(connection) == signature:
+        return 0
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        # Another worker may have done the work while we waited for the lock
+        if indexed_signature(connection) == signature:
+            connection.execute('COMMIT')
+            return 0
+        known = dict(connection.execute('SELECT line_number, crc FROM lines'))
+        reindexed = 0
+        last_line = 0
+        for line_number, raw in lines():
+            last_line = line_number
+            crc = zlib.crc32(raw)
+            if known.get(line_number) == crc:
+                continue
+            if line_number in known:
+                _remove_lines(connection, [line_number])
+            _add_line(connection, line_number, raw)
+            connection.execute('INSERT OR REPLACE INTO lines (line_number, crc) VALUES (?, ?)', (line_number, crc))
+            reindexed += 1
+        removed = [line_number for line_number in known if line_number > last_line]
+        _remove_lines(connection, removed)
+        connection.execute('DELETE FROM lines WHERE line_number > ?', (last_line,))
+        set_signature(connection, signature)
+        connection.execute('COMMIT')
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+    return reindexed
+
+
+def restamp_search_index(connection, old_signature, new_signature):
+    """Carry the index over a write that only changed answers"""
+    connection.execute(
+        "UPDATE meta SET value = ? WHERE key = 'signature' AND value = ?", (new_signature, old_signature))
+
+
+def search(connection, query, question_type=None):
+    """Return [(score, line_number, video_key, data_id)] ranked by BM25, best first"""
+    tokens = list(dict.fromkeys(tokenize(query)))
+    if not tokens:
+        return []
+    document_count, average_length = connection.execute(
+        'SELECT COUNT(*), COALESCE(AVG(length), 0) FROM documents').fetchone()
+    if not document_count:
+        return []
+
+    scores = {}
+    for token in tokens:
+        postings = connection.execute(
+            'SELECT p.doc_id, p.tf, d.length FROM postings p JOIN documents d ON d.doc_id = p.doc_id WHERE p.token = ?',
+            (token,)
+        ).fetchall()
+        if not postings:
+            continue
+        idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+        for doc_id, tf, length in postings:
+            norm = tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / (average_length or 1)))
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf * norm
+
+    results = []
+    query_sql = 'SELECT doc_id, line_number, video_key, data_id, question_type FROM documents WHERE doc_id IN ({})'
+    doc_ids = list(scores)
+    # Stay below SQLite's bound-parameter limit
+    for i in range(0, len(doc_ids), 900):
+        batch = doc_ids[i:i + 900]
+        for doc_id, line_number, video_key, data_id, doc_question_type in connection.execute(
+                query_sql.format(','.join('?' * len(batch))), batch):
+            if question_type is None or doc_question_type == question_type:
+                results.append((scores[doc_id], line_number, doc_id, video_key, data_id))
+    # Equal scores keep file order
+    results.sort(key=lambda result: (-result[0], result[1], result[2]))
+    return [(score, line_number, video_key, data_id) for score, line_number, _, video_key, data_id in results]
@@ -0,0 +1,78 @@
+import argparse
+import os
+import signal
+import socket
+import sys
+
+from werkzeug.serving import make_server
+
+# Multi-process deployment of backend_simple.py: the parent opens one
+# listening socket and forks N workers that accept on it. Workers share the
+# data file through the dataset lock and atomic renames in safe_io.py.
+
+
+def run_worker(host, port, fd):
+    # Import inside the worker so background threads (journal compactor) start per process
+    from backend_simple import app
+    from storage import flush_all_stores
+
+    server = make_server(host, port, app, threaded=True, fd=fd)
+    try:
+        server.serve_forever()
+    finally:
+        # os._exit skips atexit, so write-behind edits are flushed here
+        flush_all_stores()
+
+
+def exit_worker(signum, frame):
+    # A second signal must not interrupt the final flush
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    sys.exit(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the annotation tool with several worker processes')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    if not hasattr(os, 'fork'):
+        sys.exit('Multi-worker mode needs os.fork; run backend_simple.py directly on this platform')
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((args.host, args.port))
+    listener.listen(128)
+    listener.set_inheritable(True)
+
+    workers = []
+    for _ in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, exit_worker)
+            signal.signal(signal.SIGTERM, exit_worker)
+            try:
+                run_worker(args.host, args.port, listener.fileno())
+            finally:
+                os._exit(0)
+        workers.append(pid)
+
+    print(f" * Serving on http://{args.host}:{args.port} with {len(workers)} workers")
+
+    def stop_workers(signum, frame):
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop_workers)
+    signal.signal(signal.SIGTERM, stop_workers)
+    for pid in workers:
+        os.waitpid(pid, 0)
+
+
+if __name__ == '__main__':
+    main()
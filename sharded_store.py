@@ -0,0 +1,334 @@
+import hashlib
+import os
+import heapq
+import threading
+from bisect import bisect_right
+
+from merge_annotation_files import group_annotation_files, pick_group_file
+from question_revisions import RevisionConflict
+from question_store import VALID_ANSWERS
+from question_statistics import QuestionStatistics
+
+# An annotation directory (1_45_1.jsonl, 46_90_2.jsonl, ...) served as one
+# dataset without running merge_annotation_files.py first.
+#
+# Every range file holds the dataset with global line numbers, and its
+# annotator only worked on lines start..end. Like the merge, each range
+# group uses its _2 file over its _1 file, and every line is taken from the
+# last group whose range covers it and whose file is long enough to have
+# it. Virtual line numbers count the lines taken in order, so they match
+# the line numbers of the merged file. Blank or malformed lines inside a
+# range are served as they are instead of being dropped (or filled from an
+# earlier group) like the merge does.
+#
+# Reads and writes are routed to a regular store per range file, so edits
+# go straight into the range files and the merged file can be rebuilt from
+# them at any time.
+
+
+def _owned_pieces(intervals):
+    """Split (first, last) line intervals into [first, last, index] pieces in line order,
+    giving every line to the last interval that covers it"""
+    bounds = sorted({first for first, last in intervals if first <= last}
+                    | {last + 1 for first, last in intervals if first <= last})
+    order = iter(sorted((first, index) for index, (first, last) in enumerate(intervals) if first <= last))
+    upcoming = next(order, None)
+    active = []  # (-index, last) of the intervals started so far
+    pieces = []
+    for piece_first, next_bound in zip(bounds, bounds[1:]):
+        while upcoming is not None and upcoming[0] <= piece_first:
+            heapq.heappush(active, (-upcoming[1], intervals[upcoming[1]][1]))
+            upcoming = next(order, None)
+        while active and active[0][1] < piece_first:
+            heapq.heappop(active)
+        if not active:
+            continue
+        index = -active[0][0]
+        if pieces and pieces[-1][2] == index and pieces[-1][1] == piece_first - 1:
+            pieces[-1][1] = next_bound - 1
+        else:
+            pieces.append([piece_first, next_bound - 1, index])
+    return pieces
+
+
+class ShardedQuestionStore:
+    """One dataset made of the range files of an annotation directory.
+
+    Offers the QuestionStore methods. open_store(path) returns the store
+    of one range file; the directory is re-listed whenever its mtime
+    changes and the line map is rebuilt when a range file changed length.
+    """
+
+    def __init__(self, dirpath, open_store):
+        self.filepath = dirpath
+        self.version = 0
+        self._open_store = open_store
+        self._lock = threading.RLock()
+        self._dir_mtime_ns = None
+        self._selection = []  # (start_line, end_line, path) of the file used for every range group
+        self._state = None  # (version, line count) of every selected file
+        self._runs = []  # (virtual_start, store, local_start, length) in line order
+        self._run_starts = []
+        self._line_count = 0
+        self._run_statistics = {}  # (path, local_start, length) -> (store version, QuestionStatistics)
+        self._journal = None  # arguments of enable_journal, passed on to every range file store
+        self._write_behind = None
+        self._configured = set()  # paths whose store got the current journal and write-behind settings
+
+    def _store(self, path):
+        store = self._open_store(path)
+        if path not in self._configured:
+            if self._journal is not None and hasattr(store, 'enable_journal'):
+                store.enable_journal(*self._journal)
+            if self._write_behind is not None and hasattr(store, 'enable_write_behind'):
+                store.enable_write_behind(*self._write_behind)
+            self._configured.add(path)
+        return store
+
+    def _refresh(self):
+        """Pick up added, removed or replaced range files and edits made to them"""
+        with self._lock:
+            # Taken before listing, so a change made while we list is seen next time
+            mtime_ns = os.stat(self.filepath).st_mtime_ns
+            if mtime_ns != self._dir_mtime_ns:
+                selection = []
+                for (start_line, end_line), files in sorted(group_annotation_files(self.filepath).items()):
+                    filename = pick_group_file(files)
+                    if filename is not None:
+                        selection.append((start_line, end_line, os.path.join(self.filepath, filename)))
+                self._selection = selection
+                self._dir_mtime_ns = mtime_ns
+
+            stores = [self._store(path) for _, _, path in self._selection]
+            state = [(store.current_version(), store.line_count()) for store in stores]
+            if state != self._state:
+                self._build_runs(stores, [line_count for _, line_count in state])
+                self._state = state
+                self.version += 1
+            return self._runs
+
+    def _build_runs(self, stores, line_counts):
+        runs = []
+        virtual_start = 1
+        intervals = [(start_line, min(end_line, line_count))
+                     for (start_line, end_line, _), line_count in zip(self._selection, line_counts)]
+        for first, last, index in _owned_pieces(intervals):
+            runs.append((virtual_start, stores[index], first, last - first + 1))
+            virtual_start += last - first + 1
+        self._runs = runs
+        self._run_starts = [run[0] for run in runs]
+        self._line_count = virtual_start - 1
+
+    def _locate(self, line_number):
+        """Return (store, local line number) owning a virtual line, or (None, None)"""
+        if not isinstance(line_number, int):
+            return None, None
+        i = bisect_right(self._run_starts, line_number) - 1
+        if i < 0:
+            return None, None
+        virtual_start, store, local_start, length = self._runs[i]
+        if line_number >= virtual_start + length:
+            return None, None
+        return store, local_start + line_number - virtual_start
+
+    def _to_virtual(self, runs, store, local_line):
+        """Map a line of one range file back to its virtual line, or None if it is not served"""
+        for virtual_start, run_store, local_start, length in runs:
+            if run_store is store and local_start <= local_line < local_start + length:
+                return virtual_start + local_line - local_start
+        return None
+
+    def current_version(self):
+        self._refresh()
+        return self.version
+
+    def data_tag(self):
+        """Short identifier of the current data, identical in every worker process"""
+        runs = self._refresh()
+        state = [(store.data_tag(), local_start, length) for _, store, local_start, length in runs]
+        return hashlib.sha1(repr(state).encode('utf-8')).hexdigest()[:16]
+
+    def line_count(self):
+        self._refresh()
+        return self._line_count
+
+    def questions(self, start_line=None, end_line=None):
+        """Return flattened questions, optionally limited to a virtual line range"""
+        runs = self._refresh()
+        if start_line is None or end_line is None:
+            start_line, end_line = 1, self._line_count
+        questions = []
+        for virtual_start, store, local_start, length in runs:
+            first = max(start_line, virtual_start)
+            last = min(end_line, virtual_start + length - 1)
+            if first > last:
+                continue
+            shift = virtual_start - local_start
+            for question in store.questions(first - shift, last - shift):
+                question['line_number'] += shift
+                questions.append(question)
+        return questions
+
+    def video_lines(self, video_key):
+        """Return the virtual line numbers holding video_key, in order"""
+        runs = self._refresh()
+        lines = set()
+        for store in {id(store): store for _, store, _, _ in runs}.values():
+            for local_line in store.video_lines(video_key):
+                line_number = self._to_virtual(runs, store, local_line)
+                if line_number is not None:
+                    lines.add(line_number)
+        return sorted(lines)
+
+    def search(self, query, question_type=None):
+        """Return [(score, line_number, video_key, data_id)] matching query, best first.
+
+        Every range file is searched with its own index, so scores are
+        only comparable between files with similar contents.
+        """
+        runs = self._refresh()
+        results = []
+        for store in {id(store): store for _, store, _, _ in runs}.values():
+            for score, local_line, video_key, data_id in store.search(query, question_type):
+                line_number = self._to_virtual(runs, store, local_line)
+                if line_number is not None:
+                    results.append((score, line_number, video_key, data_id))
+        results.sort(key=lambda result: (-result[0], result[1]))
+        return results
+
+    def filter_questions(self, question_type=None, answer=None, cursor_line=1, cursor_position=0,
+                         end_line=None, limit=50):
+        """Return (questions, next_cursor) like QuestionStore.filter_questions, over virtual lines"""
+        runs = self._refresh()
+        questions = []
+        for virtual_start, store, local_start, length in runs:
+            run_end = virtual_start + length - 1
+            if run_end < cursor_line:
+                continue
+            if end_line is not None and virtual_start > end_line:
+                break
+            shift = virtual_start - local_start
+            first = max(cursor_line, virtual_start)
+            position = cursor_position if cursor_line == first else 0
+            last = run_end if end_line is None else min(end_line, run_end)
+            found, next_cursor = store.filter_questions(
+                question_type, answer, first - shift, position, last - shift, limit - len(questions))
+            for question in found:
+                question['line_number'] += shift
+            questions.extend(found)
+            if next_cursor is not None:
+                local_line, position = map(int, next_cursor.split(':'))
+                return questions, f'{local_line + shift}:{position}'
+        return questions, None
+
+    def statistics(self):
+        """Return (version, distributions) over every served line.
+
+        Counts are kept per range and only recounted for ranges whose file
+        changed since.
+        """
+        runs = self._refresh()
+        statistics = QuestionStatistics()
+        with self._lock:
+            run_statistics = {}
+            for virtual_start, store, local_start, length in runs:
+                key = (store.filepath, local_start, length)
+                store_version = store.current_version()
+                cached = self._run_statistics.get(key)
+                if cached is None or cached[0] != store_version:
+                    counts = QuestionStatistics()
+                    counts.add_questions(store.questions(local_start, local_start + length - 1))
+                    cached = (store_version, counts)
+                run_statistics[key] = cached
+                statistics.update(cached[1])
+            self._run_statistics = run_statistics
+            return self.version, statistics.distributions()
+
+    def _conflict(self, runs, store, conflict):
+        """Re-raise a range file store's RevisionConflict with virtual line numbers"""
+        for question in conflict.conflicts:
+            question['line_number'] = self._to_virtual(runs, store, question['line_number'])
+        return conflict
+
+    def update_answer(self, line_number, video_key, data_id, new_answer_choice, revision=None):
+        """Set the answer of one question in the range file that owns its line"""
+        runs = self._refresh()
+        store, local_line = self._locate(line_number)
+        if store is None:
+            return False
+        try:
+            return store.update_answer(local_line, video_key, data_id, new_answer_choice, revision)
+        except RevisionConflict as conflict:
+            raise self._conflict(runs, store, conflict)
+
+    def update_answers(self, edits, revisions=None):
+        """Validate a batch of (line_number, video_key, data_id, answer) edits
+        over every range file first, then apply them with one write per file.
+        Returns a list of error messages; nothing is written unless it is empty.
+
+        Revisions are checked against every range file before anything is
+        written, and again by each file's store as it writes, so a batch
+        spanning several files can only be partly applied when one of them
+        changes in between.
+        """
+        runs = self._refresh()
+        errors = []
+        conflicts = []
+        edits_by_store = {}
+        for i, ((line_number, video_key, data_id, answer), revision) in enumerate(
+                zip(edits, revisions or [None] * len(edits))):
+            if answer not in VALID_ANSWERS:
+                errors.append(f"Edit {i}: invalid answer {answer!r}")
+                continue
+            store, local_line = self._locate(line_number)
+            if store is None:
+                errors.append(f"Edit {i}: line {line_number} out of range")
+                continue
+            question = next((question for question in store.questions(local_line, local_line)
+                             if question['video_key'] == video_key and question['data_id'] == data_id), None)
+            if question is None:
+                errors.append(f"Edit {i}: question {video_key}/{data_id} not found on line {line_number}")
+                continue
+            if revision is not None and revision != question['revision']:
+                conflicts.append({'line_number': line_number, 'video_key': video_key, 'data_id': data_id,
+                                  'answer': question.get('answer', 'Unknown'), 'revision': question['revision']})
+            store_edits, store_revisions = edits_by_store.setdefault(id(store), (store, [], []))[1:]
+            store_edits.append((local_line, video_key, data_id, answer))
+            store_revisions.append(revision)
+        if errors:
+            return errors
+        if conflicts:
+            raise RevisionConflict(conflicts)
+        for store, store_edits, store_revisions in edits_by_store.values():
+            try:
+                errors.extend(store.update_answers(store_edits, store_revisions))
+            except RevisionConflict as conflict:
+                raise self._conflict(runs, store, conflict)
+        return errors
+
+    def enable_journal(self, max_bytes, max_age, check_interval=1.0):
+        """Put the store of every range file, present and future, in journal mode"""
+        with self._lock:
+            self._journal = (max_bytes, max_age, check_interval)
+            self._configured = set()
+
+    def enable_write_behind(self, flush_interval):
+        """Put the store of every range file, present and future, in write-behind mode"""
+        with self._lock:
+            self._write_behind = (flush_interval,)
+            self._configured = set()
+
+    def write_behind_status(self):
+        """Return the flush status of every range file store, summed up"""
+        with self._lock:
+            statuses = [self._store(path).write_behind_status() for _, _, path in self._selection]
+        finished = [status for status in statuses if status['last_flush'] is not None]
+        return {
+            'write_behind': self._write_behind is not None,
+            'flush_interval_ms': None if self._write_behind is None else self._write_behind[0] * 1000,
+            'unflushed_edits': sum(status['unflushed_edits'] for status in statuses),
+            'flush_lag_ms': max((status['flush_lag_ms'] for status in statuses), default=0.0),
+            'last_flush': max((status['last_flush'] for status in finished), default=None),
+            'last_flush_ms': max((status['last_flush_ms'] for status in finished), default=None),
+            'flush_errors': sum(status['flush_errors'] for status in statuses),
+        }
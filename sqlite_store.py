@@ -0,0 +1,392 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+
+import json_codec
+import search_index
+from question_revisions import RevisionConflict
+from question_statistics import QuestionStatistics
+from question_store import VALID_ANSWERS
+from request_metrics import phase
+from safe_io import atomic_write, dataset_lock
+
+# SQLite storage engine. The database sits next to the JSONL file
+# (questions_converted.jsonl.sqlite3) and is imported from it on first use;
+# from then on the database is the source of truth and export_jsonl()
+# writes it back out in the exact JSONL format.
+SQLITE_SUFFIX = '.sqlite3'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS lines (
+    line_number INTEGER PRIMARY KEY,
+    video_keys TEXT  -- JSON list of the line's video keys in order, NULL for a blank line
+);
+CREATE TABLE IF NOT EXISTS questions (
+    line_number INTEGER NOT NULL,
+    video_position INTEGER NOT NULL,  -- index of video_key within the line
+    position INTEGER NOT NULL,  -- index of the question within the video's list
+    video_key TEXT NOT NULL,
+    data_id INTEGER,
+    question_type TEXT,
+    answer TEXT,
+    payload TEXT NOT NULL,  -- the full question object as JSON, key order preserved
+    revision INTEGER NOT NULL DEFAULT 0,  -- bumped by every accepted answer edit
+    PRIMARY KEY (line_number, video_position, position)
+);
+CREATE INDEX IF NOT EXISTS questions_video_data_id ON questions (video_key, data_id);
+CREATE INDEX IF NOT EXISTS questions_question_type ON questions (question_type);
+CREATE INDEX IF NOT EXISTS questions_answer ON questions (answer);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 1);
+'''
+
+
+def connect(db_path):
+    connection = sqlite3.connect(db_path, timeout=30)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.executescript(SCHEMA)
+    if 'revision' not in [row[1] for row in connection.execute('PRAGMA table_info(questions)')]:
+        # Imported before questions had revisions
+        try:
+            connection.execute('ALTER TABLE questions ADD COLUMN revision INTEGER NOT NULL DEFAULT 0')
+        except sqlite3.OperationalError:
+            # Another worker added it first
+            pass
+    return connection
+
+
+def import_jsonl(jsonl_path, db_path, batch_size=10000):
+    """Bulk-load a JSONL file into a fresh SQLite database.
+
+    The database is built in a temp file of this process and renamed into
+    place, so readers never see a half-imported one.
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(db_path)), prefix=os.path.basename(db_path) + '.', suffix='.import'
+    )
+    os.close(fd)
+    try:
+        _import_into(jsonl_path, tmp_path, batch_size)
+        os.replace(tmp_path, db_path)
+    finally:
+        for path in (tmp_path, tmp_path + '-wal', tmp_path + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _import_into(jsonl_path, tmp_path, batch_size):
+    connection = connect(tmp_path)
+    line_rows = []
+    question_rows = []
+
+    def flush():
+        connection.executemany('INSERT INTO lines VALUES (?, ?)', line_rows)
+        connection.executemany('INSERT INTO questions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', question_rows)
+        line_rows.clear()
+        question_rows.clear()
+
+    with connection:
+        with open(jsonl_path, 'r', encoding='utf-8') as file:
+            for line_num, line in enumerate(file, 1):
+                if not line.strip():
+                    line_rows.append((line_num, None))
+                    continue
+                data = json_codec.loads(line.strip())
+                line_rows.append((line_num, json_codec.dumps(list(data))))
+                for video_position, (video_key, questions) in enumerate(data.items()):
+                    for position, question in enumerate(questions):
+                        question_rows.append((
+                            line_num, video_position, position, video_key,
+                            question.get('data_id'), question.get('question_type'), question.get('answer'),
+                            json_codec.dumps(question), 0,
+                        ))
+                if len(line_rows) >= batch_size:
+                    flush()
+        flush()
+    connection.close()
+
+
+def iter_jsonl_lines(connection):
+    """Yield every line of the dataset in the original JSONL format"""
+    question_rows = connection.execute(
+        'SELECT line_number, video_key, answer, payload FROM questions ORDER BY line_number, video_position, position'
+    )
+    pending = next(question_rows, None)
+    for line_number, video_keys in connection.execute('SELECT line_number, video_keys FROM lines ORDER BY line_number'):
+        if video_keys is None:
+            yield '\n'
+            continue
+        line_data = {video_key: [] for video_key in json_codec.loads(video_keys)}
+        while pending is not None and pending[0] == line_number:
+            _, video_key, answer, payload = pending
+            question = json_codec.loads(payload)
+            if answer is not None:
+                question['answer'] = answer
+            line_data[video_key].append(question)
+            pending = next(question_rows, None)
+        yield json_codec.dumps(line_data) + '\n'
+
+
+def export_jsonl(db_path, output_path):
+    """Stream the database back out as a JSONL file"""
+    connection = connect(db_path)
+    try:
+        atomic_write(output_path, (line.encode('utf-8') for line in iter_jsonl_lines(connection)))
+    finally:
+        connection.close()
+
+
+class SqliteQuestionStore:
+    """Question store backed by an indexed SQLite database.
+
+    Offers the same methods as QuestionStore. Range reads and single answer
+    updates are index lookups, and every write is one transaction that also
+    bumps the version kept in the database, so all worker processes agree
+    on it.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.db_path = filepath + SQLITE_SUFFIX
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._statistics_cache = (None, None)
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            with self._init_lock:
+                if not os.path.exists(self.db_path):
+                    # Workers starting together import once; the others wait and find the database
+                    with dataset_lock(self.filepath, exclusive=True):
+                        if not os.path.exists(self.db_path):
+                            # Raises FileNotFoundError when there is no data at all
+                            import_jsonl(self.filepath, self.db_path)
+            connection = connect(self.db_path)
+            self._local.connection = connection
+        return connection
+
+    def current_version(self):
+        return self._connection().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def data_tag(self):
+        return f'sqlite-{self.current_version()}'
+
+    def line_count(self):
+        return self._connection().execute('SELECT COALESCE(MAX(line_number), 0) FROM lines').fetchone()[0]
+
+    def questions(self, start_line=None, end_line=None):
+        """Return flattened questions, optionally limited to a line range"""
+        query = 'SELECT line_number, video_key, answer, payload, revision FROM questions'
+        params = ()
+        if start_line is not None and end_line is not None:
+            query += ' WHERE line_number BETWEEN ? AND ?'
+            params = (start_line, end_line)
+        query += ' ORDER BY line_number, video_position, position'
+
+        questions_with_lines = []
+        with phase('decode'):
+            for line_number, video_key, answer, payload, revision in self._connection().execute(query, params):
+                question = json_codec.loads(payload)
+                if answer is not None:
+                    question['answer'] = answer
+                questions_with_lines.append(
+                    {'line_number': line_number, 'video_key': video_key, **question, 'revision': revision})
+        return questions_with_lines
+
+    def _search_connection(self):
+        connection = getattr(self._local, 'search', None)
+        if connection is None:
+            connection = search_index.connect(self.filepath + search_index.SEARCH_INDEX_SUFFIX)
+            self._local.search = connection
+        return connection
+
+    def search(self, query, question_type=None):
+        """Return [(score, line_number, video_key, data_id)] matching query, best first"""
+        connection = self._connection()
+        search_connection = self._search_connection()
+        search_index.update_search_index(
+            search_connection, f'sqlite-{self.current_version()}',
+            lambda: ((line_number, line.encode('utf-8')) for line_number, line in enumerate(iter_jsonl_lines(connection), 1)))
+        return search_index.search(search_connection, query, question_type)
+
+    def _bump_version(self, connection):
+        """Increase the data version inside a write transaction, returning (old, new)"""
+        old_version = connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+        connection.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+        return old_version, old_version + 1
+
+    def _restamp_search(self, versions):
+        # Answer edits leave the indexed text alone
+        if os.path.exists(self.filepath + search_index.SEARCH_INDEX_SUFFIX):
+            old_version, new_version = versions
+            search_index.restamp_search_index(
+                self._search_connection(), f'sqlite-{old_version}', f'sqlite-{new_version}')
+
+    def video_lines(self, video_key):
+        """Return the line numbers holding video_key, in file order"""
+        return [row[0] for row in self._connection().execute(
+            'SELECT DISTINCT line_number FROM questions WHERE video_key = ? ORDER BY line_number', (video_key,))]
+
+    def filter_questions(self, question_type=None, answer=None, cursor_line=1, cursor_position=0,
+                         end_line=None, limit=50):
+        """Return (questions, next_cursor) for up to limit questions matching every given filter,
+        using the question_type and answer indexes. next_cursor is "line:position" or None."""
+        conditions = ['line_number >= ?']
+        params = [cursor_line]
+        if end_line is not None:
+            conditions.append('line_number <= ?')
+            params.append(end_line)
+        for column, value in (('question_type', question_type), ('answer', answer)):
+            if value == 'Unknown':
+                conditions.append(f"({column} IS NULL OR {column} = 'Unknown')")
+            elif value is not None:
+                conditions.append(f'{column} = ?')
+                params.append(value)
+        # position is the index of the question within its line, as in QuestionStore
+        rows = self._connection().execute(f'''
+            SELECT line_number, video_key, answer, payload, revision,
+                   (SELECT COUNT(*) FROM questions AS earlier
+                    WHERE earlier.line_number = q.line_number
+                      AND (earlier.video_position, earlier.position) < (q.video_position, q.position))
+            FROM questions AS q WHERE {' AND '.join(conditions)}
+            ORDER BY line_number, video_position, position''', params)
+
+        questions = []
+        for line_number, video_key, row_answer, payload, revision, position in rows:
+            if line_number == cursor_line and position < cursor_position:
+                continue
+            if len(questions) == limit:
+                return questions, f'{line_number}:{position}'
+            question = json_codec.loads(payload)
+            if row_answer is not None:
+                question['answer'] = row_answer
+            questions.append({'line_number': line_number, 'video_key': video_key, **question, 'revision': revision})
+        return questions, None
+
+    def statistics(self):
+        """Return (version, distributions) computed with indexed GROUP BY queries"""
+        connection = self._connection()
+        version = self.current_version()
+        cached_version, distributions = self._statistics_cache
+        if cached_version == version:
+            return version, distributions
+
+        statistics = QuestionStatistics()
+        for question_type, count in connection.execute(
+                'SELECT COALESCE(question_type, ?), COUNT(*) FROM questions GROUP BY 1 ORDER BY MIN(rowid)', ('Unknown',)):
+            statistics.question_type_counts[question_type] = count
+            statistics.total += count
+        for answer, count in connection.execute(
+                'SELECT COALESCE(answer, ?), COUNT(*) FROM questions GROUP BY 1', ('Unknown',)):
+            statistics.answer_counts[answer] = count
+
+        distributions = statistics.distributions()
+        self._statistics_cache = (version, distributions)
+        return version, distributions
+
+    def _set_answer(self, connection, line_number, video_key, data_id, answer, revision=None):
+        """Set the answer of a question and bump its revision, unless it is no longer at revision.
+        Returns whether a row was updated."""
+        return connection.execute(
+            '''UPDATE questions SET answer = ?, revision = revision + 1 WHERE rowid = (
+                   SELECT rowid FROM questions WHERE line_number = ? AND video_key = ? AND data_id = ?
+                   ORDER BY position LIMIT 1) AND (? IS NULL OR revision = ?)''',
+            (answer, line_number, video_key, data_id, revision, revision)
+        ).rowcount > 0
+
+    def _question_state(self, connection, line_number, video_key, data_id):
+        """The current answer and revision of a question, as reported in a conflict, or None"""
+        row = connection.execute(
+            '''SELECT COALESCE(answer, ?), revision FROM questions
+               WHERE line_number = ? AND video_key = ? AND data_id = ? ORDER BY position LIMIT 1''',
+            ('Unknown', line_number, video_key, data_id)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'line_number': line_number, 'video_key': video_key, 'data_id': data_id,
+                'answer': row[0], 'revision': row[1]}
+
+    def update_answer(self, line_number, video_key, data_id, new_answer_choice, revision=None):
+        """Set the answer of one question in a single transaction.
+
+        With a revision the edit only goes through while the question is
+        still at that revision, otherwise RevisionConflict is raised.
+        """
+        connection = self._connection()
+        with phase('file_write'), connection:
+            row = connection.execute('SELECT video_keys FROM lines WHERE line_number = ?', (line_number,)).fetchone()
+            if row is None or row[0] is None:
+                return False
+            if new_answer_choice in VALID_ANSWERS:
+                if not self._set_answer(connection, line_number, video_key, data_id, new_answer_choice, revision):
+                    state = self._question_state(connection, line_number, video_key, data_id)
+                    if state is not None:
+                        raise RevisionConflict([state])
+            versions = self._bump_version(connection)
+        self._restamp_search(versions)
+        return True
+
+    def update_answers(self, edits, revisions=None):
+        """Validate a batch of (line_number, video_key, data_id, answer) edits
+        together and apply them in one transaction. Returns error messages.
+
+        revisions optionally lists the revision every edit was made
+        against; if any question moved on, RevisionConflict is raised and
+        the transaction is rolled back.
+        """
+        connection = self._connection()
+        with phase('file_write'), connection:
+            errors = []
+            for i, (line_number, video_key, data_id, answer) in enumerate(edits):
+                if answer not in VALID_ANSWERS:
+                    errors.append(f"Edit {i}: invalid answer {answer!r}")
+                    continue
+                found = connection.execute(
+                    'SELECT 1 FROM questions WHERE video_key = ? AND data_id = ? AND line_number = ?',
+                    (video_key, data_id, line_number)
+                ).fetchone()
+                if found is None:
+                    if not isinstance(line_number, int) or not 1 <= line_number <= self.line_count():
+                        errors.append(f"Edit {i}: line {line_number} out of range")
+                    else:
+                        errors.append(f"Edit {i}: question {video_key}/{data_id} not found on line {line_number}")
+            if errors or not edits:
+                return errors
+
+            # One update per question, so repeating a question in the batch bumps its revision once
+            latest = {}
+            for (line_number, video_key, data_id, answer), revision in zip(edits, revisions or [None] * len(edits)):
+                key = (line_number, video_key, data_id)
+                expected = latest[key][1] if key in latest else None
+                latest[key] = (answer, revision if expected is None else expected)
+            conflicts = [
+                self._question_state(connection, *key)
+                for key, (answer, revision) in latest.items()
+                if not self._set_answer(connection, *key, answer, revision)
+            ]
+            if conflicts:
+                raise RevisionConflict(conflicts)
+            versions = self._bump_version(connection)
+        self._restamp_search(versions)
+        return []
+
+if __name__ == '__main__':
+    # python sqlite_store.py import questions_converted.jsonl
+    # python sqlite_store.py export questions_converted.jsonl [output.jsonl]
+    if len(sys.argv) < 3 or sys.argv[1] not in ('import', 'export'):
+        sys.exit('Usage: python sqlite_store.py import|export <data.jsonl> [output.jsonl]')
+    data_file = sys.argv[2]
+    if sys.argv[1] == 'import':
+        import_jsonl(data_file, data_file + SQLITE_SUFFIX)
+        print(f"Imported {data_file} into {data_file + SQLITE_SUFFIX}")
+    else:
+        output_file = sys.argv[3] if len(sys.argv) > 3 else data_file
+        export_jsonl(data_file + SQLITE_SUFFIX, output_file)
+        print(f"Exported {data_file + SQLITE_SUFFIX} to {output_file}")
@@ -0,0 +1,60 @@
+import atexit
+import os
+import threading
+
+from question_store import QuestionStore
+from sharded_store import ShardedQuestionStore
+from sqlite_store import SqliteQuestionStore
+
+# Storage engines that can sit behind read_jsonl_file/update_correct_answer.
+# Every engine offers the QuestionStore methods (questions, update_answer,
+# update_answers, statistics, video_lines, search, filter_questions, line_count,
+# current_version, data_tag).
+STORAGE_ENGINES = {
+    'jsonl': QuestionStore,
+    'sqlite': SqliteQuestionStore,
+}
+
+storage_engine = 'jsonl'
+
+# One store per data file, shared by all request threads
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def set_storage_engine(name):
+    """Choose the engine used for stores created from now on"""
+    global storage_engine
+    if name not in STORAGE_ENGINES:
+        raise ValueError(f"Unknown storage engine {name!r}, expected one of {', '.join(STORAGE_ENGINES)}")
+    storage_engine = name
+
+
+def get_question_store(filepath):
+    """Return the process-wide store for filepath.
+
+    A directory is served as one dataset made of its annotation range
+    files, each of them kept in a store of the current engine.
+    """
+    with _stores_lock:
+        store = _stores.get(filepath)
+        if store is None:
+            if os.path.isdir(filepath):
+                store = ShardedQuestionStore(filepath, get_question_store)
+            else:
+                store = STORAGE_ENGINES[storage_engine](filepath)
+            _stores[filepath] = store
+        return store
+
+
+@atexit.register
+def flush_all_stores():
+    """Write out edits that write-behind stores have acknowledged but not flushed yet"""
+    with _stores_lock:
+        stores = list(_stores.values())
+    for store in stores:
+        if getattr(store, 'write_behind', False):
+            try:
+                store.flush()
+            except Exception as e:
+                print(f"Error flushing queued answers to {store.filepath}: {e}")
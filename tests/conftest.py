@@ -0,0 +1,11 @@
+import pytest
+
+from benchmarks.generate_dataset import generate_questions_file
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    """A small questions_converted.jsonl-shaped dataset"""
+    path = str(tmp_path / 'questions_converted.jsonl')
+    generate_questions_file(path, 20)
+    return path
@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+import backend_simple
+
+
+@pytest.fixture
+def client(data_file, monkeypatch):
+    monkeypatch.setattr(backend_simple, 'DATA_FILE', data_file)
+    return backend_simple.app.test_client()
+
+
+def first_question(client, line_number):
+    response = client.get(f'/api/questions?start_line={line_number}&end_line={line_number}')
+    return json.loads(response.get_data())['questions'][0]
+
+
+def edit(question, answer, revision):
+    return {'line_number': question['line_number'], 'video_key': question['video_key'],
+            'data_id': question['data_id'], 'correct_choice': answer, 'revision': revision}
+
+
+def test_update_answer_returns_409_for_an_old_revision(client):
+    question = first_question(client, 2)
+
+    first = client.post('/update_answer', json=edit(question, 'A', question['revision']))
+    second = client.post('/update_answer', json=edit(question, 'B', question['revision']))
+
+    assert first.status_code == 200
+    assert first.get_json()['revision'] == question['revision'] + 1
+    assert second.status_code == 409
+    assert second.get_json()['conflicts'] == [{'line_number': question['line_number'],
+                                               'video_key': question['video_key'], 'data_id': question['data_id'],
+                                               'answer': 'A', 'revision': question['revision'] + 1}]
+    assert first_question(client, 2)['answer'] == 'A'
+
+
+def test_update_answers_applies_nothing_on_a_conflict(client):
+    stale, fresh = first_question(client, 4), first_question(client, 6)
+    client.post('/update_answer', json=edit(stale, 'C', stale['revision']))
+
+    response = client.post('/update_answers', json={'edits': [edit(fresh, 'D', fresh['revision']),
+                                                              edit(stale, 'D', stale['revision'])]})
+
+    assert response.status_code == 409
+    assert [conflict['line_number'] for conflict in response.get_json()['conflicts']] == [4]
+    assert first_question(client, 6)['answer'] == fresh['answer']
+
+
+@pytest.mark.parametrize('body', [[1, 2], 'edits', {'edits': {}}, {'edits': [1]}, {'edits': [{'revision': '1'}]}])
+def test_update_answers_rejects_malformed_bodies(client, body):
+    response = client.post('/update_answers', json=body)
+
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+@pytest.mark.parametrize('query', ['start_line=abc', 'end_line=x', 'answer=A&cursor=1:x', 'answer=A&end_line=x'])
+def test_annotate_rejects_malformed_positions(client, query):
+    assert client.get(f'/annotate?{query}').status_code == 400
@@ -0,0 +1,75 @@
+import json
+import os
+
+import pytest
+
+from merge_annotation_files import merge_annotation_files, select_group_files
+
+
+def write_group(annotation_dir, name, first, count, bad=()):
+    with open(os.path.join(annotation_dir, name), 'w', encoding='utf-8') as f:
+        for line_num in range(first, first + count):
+            if line_num in bad:
+                f.write('{not json\n')
+            else:
+                f.write(json.dumps({'line': line_num, 'file': name}) + '\n')
+
+
+def baseline_merge(annotation_dir):
+    """The original merge: every group in turn overwrites the lines it provides"""
+    all_data = {}
+    for start_line, end_line, target_file in select_group_files(annotation_dir):
+        with open(os.path.join(annotation_dir, target_file), 'r', encoding='utf-8') as f:
+            for i, line in enumerate(f, 1):
+                if start_line <= i <= end_line:
+                    try:
+                        all_data[i] = json.loads(line.strip())
+                    except json.JSONDecodeError:
+                        continue
+    return [all_data[i] for i in sorted(all_data)]
+
+
+def read_output(output_file):
+    with open(output_file, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+LAYOUTS = {
+    # 46_90 lies inside 1_100, lines 91-100 still come from 1_100
+    'nested': [('1_100_1.jsonl', 1, 100, ()), ('46_90_1.jsonl', 1, 90, ())],
+    # 40_90 only has 41 lines, lines 42-45 still come from 1_45
+    'short_file': [('1_45_1.jsonl', 1, 45, ()), ('40_90_1.jsonl', 1, 41, ())],
+    # a malformed line of the later group falls back to the earlier group
+    'malformed_overlap': [('1_45_1.jsonl', 1, 45, ()), ('40_90_1.jsonl', 1, 90, (42,))],
+    'adjacent': [('1_45_1.jsonl', 1, 45, ()), ('46_90_1.jsonl', 1, 90, ()), ('46_90_2.jsonl', 1, 90, (50,))],
+}
+
+
+@pytest.mark.parametrize('layout', sorted(LAYOUTS))
+def test_merge_matches_baseline(tmp_path, layout):
+    annotation_dir = tmp_path / 'annotation'
+    annotation_dir.mkdir()
+    for name, first, count, bad in LAYOUTS[layout]:
+        write_group(annotation_dir, name, first, count, bad)
+    output_file = str(tmp_path / 'merged.jsonl')
+
+    merge_annotation_files(str(annotation_dir), output_file, workers=1, incremental=False)
+
+    assert read_output(output_file) == baseline_merge(str(annotation_dir))
+
+
+@pytest.mark.parametrize('layout', sorted(LAYOUTS))
+def test_incremental_merge_matches_full_merge(tmp_path, layout):
+    annotation_dir = tmp_path / 'annotation'
+    annotation_dir.mkdir()
+    for name, first, count, bad in LAYOUTS[layout]:
+        write_group(annotation_dir, name, first, count, bad)
+    output_file = str(tmp_path / 'merged.jsonl')
+    merge_annotation_files(str(annotation_dir), output_file, workers=1)
+
+    # change only the later group so the earlier one is copied from the old output
+    name, first, count, bad = LAYOUTS[layout][-1]
+    write_group(annotation_dir, name, first, count - 3, bad + (first + 44,))
+    merge_annotation_files(str(annotation_dir), output_file, workers=1)
+
+    assert read_output(output_file) == baseline_merge(str(annotation_dir))
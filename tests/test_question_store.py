@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from question_revisions import RevisionConflict
+from question_store import QuestionStore
+from storage import flush_all_stores, get_question_store
+
+
+def other_answer(question):
+    return 'B' if question['answer'] == 'A' else 'A'
+
+
+def answer_on_disk(data_file, question):
+    with open(data_file, 'r', encoding='utf-8') as f:
+        line = json.loads(f.readlines()[question['line_number'] - 1])
+    return next(q['answer'] for q in line[question['video_key']] if q['data_id'] == question['data_id'])
+
+
+def test_edit_against_an_old_revision_is_refused(data_file):
+    store = QuestionStore(data_file)
+    question = store.questions(3, 3)[0]
+    key = (question['line_number'], question['video_key'], question['data_id'])
+    assert question['revision'] == 0
+
+    store.update_answer(*key, other_answer(question), revision=0)
+    with pytest.raises(RevisionConflict) as conflict:
+        store.update_answer(*key, question['answer'], revision=0)
+
+    assert conflict.value.conflicts == [{'line_number': key[0], 'video_key': key[1], 'data_id': key[2],
+                                         'answer': other_answer(question), 'revision': 1}]
+    assert answer_on_disk(data_file, question) == other_answer(question)
+
+
+def test_write_behind_edits_reach_the_disk_on_flush(data_file):
+    store = QuestionStore(data_file)
+    # Long enough that the background flusher never runs during the test
+    store.enable_write_behind(3600)
+    question = store.questions(5, 5)[0]
+
+    store.update_answer(question['line_number'], question['video_key'], question['data_id'], other_answer(question))
+
+    assert store.questions(5, 5)[0]['answer'] == other_answer(question)
+    assert answer_on_disk(data_file, question) == question['answer']
+    assert store.write_behind_status()['unflushed_edits'] == 1
+    store.flush()
+    assert answer_on_disk(data_file, question) == other_answer(question)
+    assert store.write_behind_status()['unflushed_edits'] == 0
+    assert QuestionStore(data_file).questions(5, 5)[0]['answer'] == other_answer(question)
+
+
+def test_flush_all_stores_writes_queued_edits(data_file):
+    # What runs at exit, also on SIGTERM
+    store = get_question_store(data_file)
+    store.enable_write_behind(3600)
+    question = store.questions(7, 7)[0]
+    store.update_answer(question['line_number'], question['video_key'], question['data_id'], other_answer(question))
+    assert answer_on_disk(data_file, question) == question['answer']
+
+    flush_all_stores()
+
+    assert answer_on_disk(data_file, question) == other_answer(question)
@@ -0,0 +1,67 @@
+import json
+import os
+
+import pytest
+
+from merge_annotation_files import merge_annotation_files
+from question_store import QuestionStore
+from sharded_store import ShardedQuestionStore
+
+
+def write_group(annotation_dir, name, count):
+    with open(os.path.join(annotation_dir, name), 'w', encoding='utf-8') as f:
+        for line_num in range(1, count + 1):
+            question = {'data_id': 0, 'question': 'Who served?', 'question_type': 'Action Recognition',
+                        'options': {'A': 'a', 'B': 'b', 'C': 'c', 'D': 'd'}, 'answer': 'A'}
+            f.write(json.dumps({f"{name}:{line_num}": [question]}) + '\n')
+
+
+def open_sharded(annotation_dir):
+    stores = {}
+
+    def open_store(path):
+        if path not in stores:
+            stores[path] = QuestionStore(path)
+        return stores[path]
+
+    return ShardedQuestionStore(annotation_dir, open_store)
+
+
+LAYOUTS = {
+    'nested': [('1_100_1.jsonl', 100), ('46_90_1.jsonl', 90)],
+    'short_file': [('1_45_1.jsonl', 45), ('40_90_1.jsonl', 41)],
+    'adjacent': [('1_45_1.jsonl', 45), ('46_90_1.jsonl', 90), ('46_90_2.jsonl', 90), ('91-135_1.jsonl', 120)],
+    'gap': [('1_45_1.jsonl', 45), ('91_135_1.jsonl', 135), ('100_110_2.jsonl', 110)],
+}
+
+
+@pytest.mark.parametrize('layout', sorted(LAYOUTS))
+def test_virtual_lines_match_merged_file(tmp_path, layout):
+    annotation_dir = tmp_path / 'annotation'
+    annotation_dir.mkdir()
+    for name, count in LAYOUTS[layout]:
+        write_group(annotation_dir, name, count)
+    output_file = str(tmp_path / 'merged.jsonl')
+    merge_annotation_files(str(annotation_dir), output_file, workers=1, incremental=False)
+    with open(output_file, 'r', encoding='utf-8') as f:
+        merged_keys = [next(iter(json.loads(line))) for line in f]
+
+    store = open_sharded(str(annotation_dir))
+    served = {question['line_number']: question['video_key'] for question in store.questions()}
+
+    assert store.line_count() == len(merged_keys)
+    assert [served[line_number] for line_number in range(1, len(merged_keys) + 1)] == merged_keys
+
+
+def test_edit_lands_in_the_file_owning_the_line(tmp_path):
+    annotation_dir = tmp_path / 'annotation'
+    annotation_dir.mkdir()
+    for name, count in LAYOUTS['nested']:
+        write_group(annotation_dir, name, count)
+    store = open_sharded(str(annotation_dir))
+
+    # virtual line 95 is line 95 of 1_100_1.jsonl, past the end of 46_90_1.jsonl
+    assert store.update_answer(95, '1_100_1.jsonl:95', 0, 'C')
+    with open(annotation_dir / '1_100_1.jsonl', 'r', encoding='utf-8') as f:
+        line = json.loads(f.readlines()[94])
+    assert line['1_100_1.jsonl:95'][0]['answer'] == 'C'